@@ -6,27 +6,79 @@ Helps collect and format training data for HeySalad model
 
 import json
 import os
+import fcntl
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+def validate_messages(messages: List[Dict[str, str]]):
+    """Raise ValueError unless messages are well-formed chat turns"""
+    for msg in messages:
+        if 'role' not in msg or 'content' not in msg:
+            raise ValueError("Each message must have 'role' and 'content'")
+        if msg['role'] not in ['system', 'user', 'assistant']:
+            raise ValueError(f"Invalid role: {msg['role']}")
+
+@contextmanager
+def dataset_lock(path: str, shared: bool = False):
+    """Cross-process lock for a dataset file, held on a `<path>.lock` sidecar
+
+    Writers that replace the file (save, in-place shuffle) swap its inode, so
+    a flock on the data file itself would not exclude them. Every writer of
+    a dataset takes this lock; readers may take it shared.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+def append_records(path: str, records: List[dict], fsync: bool = False) -> Optional[Tuple[int, int]]:
+    """Append records to a JSONL file under the dataset's cross-process lock
+
+    The batch is written with a single write() on an O_APPEND descriptor
+    while holding the lock, so concurrent writers never interleave lines and
+    never append to a file that is being replaced. Returns the (start, end)
+    byte offsets of the batch, or None if there was nothing to write.
+    """
+    if not records:
+        return None
+    payload = "".join(json.dumps(item) + '\n' for item in records).encode()
+
+    with dataset_lock(path), open(path, 'ab') as f:
+        start = f.seek(0, os.SEEK_END)
+        f.write(payload)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+        return start, f.tell()
 
 class TrainingDataCollector:
-    """Collects and formats training data for HeySalad model"""
+    """Collects and formats training data for HeySalad model
+
+    Only `append()` is safe while other processes write the same dataset.
+    `save()` rewrites the file from memory, so it refuses to run if the file
+    changed since this collector last loaded, saved or appended it.
+    """
 
     def __init__(self, output_path="./data/training_data.jsonl"):
         self.output_path = output_path
         self.data = []
+        self.lock = threading.Lock()
+        self._flushed = 0
+        self._disk_size = None  # file size as of our last load/save/append; None if never synced
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
     def add_conversation(self, messages: List[Dict[str, str]]):
         """Add a conversation to the training data"""
         # Validate message format
-        for msg in messages:
-            if 'role' not in msg or 'content' not in msg:
-                raise ValueError("Each message must have 'role' and 'content'")
-            if msg['role'] not in ['system', 'user', 'assistant']:
-                raise ValueError(f"Invalid role: {msg['role']}")
+        validate_messages(messages)
 
-        self.data.append({"messages": messages})
+        with self.lock:
+            self.data.append({"messages": messages})
 
     def add_simple_qa(self, question: str, answer: str, system_prompt: str = None):
         """Add a simple Q&A pair"""
@@ -46,18 +98,61 @@ class TrainingDataCollector:
         self.add_conversation(messages)
 
     def save(self):
-        """Save training data to JSONL file"""
-        with open(self.output_path, 'w') as f:
-            for item in self.data:
-                f.write(json.dumps(item) + '\n')
+        """Save training data to JSONL file (replaces the whole file)
+
+        Raises RuntimeError instead of overwriting rows another writer
+        appended since this collector last synced with the file.
+        """
+        with self.lock, dataset_lock(self.output_path):
+            if (self._disk_size is not None and os.path.exists(self.output_path)
+                    and os.path.getsize(self.output_path) != self._disk_size):
+                raise RuntimeError(
+                    f"{self.output_path} changed since it was loaded; "
+                    "call load_existing() again or use append()"
+                )
+            tmp_path = f"{self.output_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                for item in self.data:
+                    f.write(json.dumps(item) + '\n')
+            os.replace(tmp_path, self.output_path)
+            self._flushed = len(self.data)
+            self._disk_size = os.path.getsize(self.output_path)
 
         print(f"✅ Saved {len(self.data)} training examples to {self.output_path}")
 
+    def append(self):
+        """Append examples added since the last save/append, safe across processes"""
+        with self.lock:
+            new = self.data[self._flushed:]
+            span = append_records(self.output_path, new)
+            self._flushed = len(self.data)
+            # Only stay in sync if nobody else wrote since our last look
+            if span and span[0] == self._disk_size:
+                self._disk_size = span[1]
+
+        print(f"✅ Appended {len(new)} training examples to {self.output_path}")
+
+    def shuffle(self, seed: int = 42, memory_mb: int = 1024):
+        """Shuffle the saved dataset on disk without loading it into memory
+
+        shuffle_jsonl holds the dataset's sidecar lock from the first read to
+        the replace, so appends from other processes wait for it.
+        """
+        from shuffle_training_data import shuffle_jsonl
+
+        with self.lock:
+            shuffle_jsonl(self.output_path, seed=seed, memory_mb=memory_mb)
+
     def load_existing(self):
         """Load existing training data"""
         if os.path.exists(self.output_path):
-            with open(self.output_path, 'r') as f:
-                self.data = [json.loads(line) for line in f]
+            with dataset_lock(self.output_path, shared=True), open(self.output_path, 'r') as f:
+                data = [json.loads(line) for line in f]
+                size = os.fstat(f.fileno()).st_size
+            with self.lock:
+                self.data = data
+                self._flushed = len(data)
+                self._disk_size = size
             print(f"📥 Loaded {len(self.data)} existing examples")
 
     def stats(self):
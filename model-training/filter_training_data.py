@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+HeySalad Training Data Quality Filter
+Drops junk conversations before tokenization and writes an audit of what was removed
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+from collections import Counter
+from itertools import islice
+from multiprocessing import Pool
+from typing import Dict, List
+
+import numpy as np
+
+# Thresholds; a row is dropped if any check fails
+FILTER_CONFIG = {
+    "min_total_chars": 20,
+    "max_total_chars": 32000,
+    "min_assistant_chars": 10,        # per assistant turn; shorter turns count as empty
+    "min_words_for_stats": 20,        # repetition / entropy only judged on longer answers
+    "max_repetition": 0.5,            # share of assistant word trigrams that are repeats
+    "min_bigram_entropy": 3.0,        # bits, over assistant word bigrams
+    "min_role_balance": 0.02,         # assistant share of user + assistant chars
+    "min_prose_ratio": 0.05,          # assistant chars outside ``` fences
+}
+
+FEATURES = (
+    "total_chars",
+    "assistant_chars",
+    "assistant_turns",
+    "empty_assistant_turns",
+    "assistant_words",
+    "repetition",
+    "bigram_entropy",
+    "role_balance",
+    "prose_ratio",
+)
+
+CODE_FENCE = re.compile(r"```.*?(?:```|\Z)", re.S)
+
+BATCH_ROWS = 20000
+
+
+def is_conversation(messages) -> bool:
+    """True if messages is a list of {"role": str, "content": str} dicts"""
+    return isinstance(messages, list) and all(
+        isinstance(msg, dict) and isinstance(msg.get("role"), str) and isinstance(msg.get("content"), str)
+        for msg in messages
+    )
+
+
+def conversation_features(messages: List[Dict[str, str]], min_assistant_chars: int) -> List[float]:
+    """Compute the FEATURES vector for one conversation"""
+    total_chars = 0
+    user_chars = 0
+    assistant_texts = []
+    empty_turns = 0
+
+    for msg in messages:
+        content = msg["content"]
+        total_chars += len(content)
+        if msg["role"] == "assistant":
+            assistant_texts.append(content)
+            if len(content.strip()) < min_assistant_chars:
+                empty_turns += 1
+        elif msg["role"] == "user":
+            user_chars += len(content)
+
+    assistant = "\n".join(assistant_texts)
+    assistant_chars = len(assistant)
+    words = assistant.split()
+
+    if words:
+        trigrams = list(zip(words, words[1:], words[2:]))
+        repetition = 1.0 - len(set(trigrams)) / len(trigrams) if trigrams else 0.0
+        bigrams = Counter(zip(words, words[1:]))
+        n = sum(bigrams.values())
+        entropy = -sum(c / n * math.log2(c / n) for c in bigrams.values()) if n else 0.0
+    else:
+        repetition, entropy = 0.0, 0.0
+
+    prose_chars = len(CODE_FENCE.sub("", assistant).strip())
+
+    return [
+        total_chars,
+        assistant_chars,
+        len(assistant_texts),
+        empty_turns,
+        len(words),
+        repetition,
+        entropy,
+        assistant_chars / (assistant_chars + user_chars) if assistant_chars + user_chars else 0.0,
+        prose_chars / assistant_chars if assistant_chars else 0.0,
+    ]
+
+
+def batch_features(args) -> np.ndarray:
+    """Feature matrix for a batch of raw JSONL lines (NaN rows are malformed)"""
+    lines, min_assistant_chars = args
+    features = np.full((len(lines), len(FEATURES)), np.nan)
+
+    for i, line in enumerate(lines):
+        try:
+            messages = json.loads(line)["messages"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        # Content-part lists, numbers or bare strings are reported as "invalid"
+        if is_conversation(messages):
+            features[i] = conversation_features(messages, min_assistant_chars)
+
+    return features
+
+
+def drop_reasons(features: np.ndarray, config: dict) -> Dict[str, np.ndarray]:
+    """Vectorised threshold checks; returns a boolean drop mask per reason"""
+    col = {name: features[:, i] for i, name in enumerate(FEATURES)}
+    long_enough = col["assistant_words"] >= config["min_words_for_stats"]
+
+    # NaN compares False everywhere, so invalid rows only trip "invalid"
+    return {
+        "invalid": np.isnan(col["total_chars"]),
+        "no_assistant": col["assistant_turns"] == 0,
+        "empty_assistant_turn": col["empty_assistant_turns"] > 0,
+        "too_short": col["total_chars"] < config["min_total_chars"],
+        "too_long": col["total_chars"] > config["max_total_chars"],
+        "repetitive": long_enough & (col["repetition"] > config["max_repetition"]),
+        "low_entropy": long_enough & (col["bigram_entropy"] < config["min_bigram_entropy"]),
+        "role_imbalance": col["role_balance"] < config["min_role_balance"],
+        "mostly_code_fences": (col["assistant_chars"] > 0) & (col["prose_ratio"] < config["min_prose_ratio"]),
+    }
+
+
+def read_batches(path: str, batch_rows: int):
+    """Yield lists of non-empty raw lines"""
+    with open(path, "rb") as f:
+        batch = []
+        for line in f:
+            if line.strip():
+                batch.append(line)
+                if len(batch) == batch_rows:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def write_batch(lines, features, config, first_row, out, audit, counts) -> int:
+    """Write kept lines and audit entries for one batch; returns rows kept"""
+    reasons = drop_reasons(features, config)
+    drop = np.zeros(len(lines), dtype=bool)
+    for reason, mask in reasons.items():
+        drop |= mask
+        counts[reason] += int(mask.sum())
+
+    for i in np.flatnonzero(~drop):
+        out.write(lines[i])
+
+    for i in np.flatnonzero(drop):
+        audit.write(json.dumps({
+            "row": first_row + int(i),
+            "reasons": [reason for reason, mask in reasons.items() if mask[i]],
+            "features": {
+                name: (None if np.isnan(value) else round(float(value), 4))
+                for name, value in zip(FEATURES, features[i])
+            },
+        }) + "\n")
+
+    return int((~drop).sum())
+
+
+def filter_dataset(
+    input_path: str,
+    output_path: str,
+    audit_path: str,
+    config: dict = None,
+    batch_rows: int = BATCH_ROWS,
+    workers: int = None,
+) -> dict:
+    """Filter a JSONL dataset, preserving row order
+
+    Features are computed in parallel batches and thresholds are applied to
+    whole batches with numpy. Dropped rows are written to `audit_path` with
+    their row number, reasons and features.
+    """
+    config = {**FILTER_CONFIG, **(config or {})}
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    for path in (output_path, audit_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    counts = Counter()
+    total = kept = 0
+
+    batches = read_batches(input_path, batch_rows)
+    with Pool(workers) as pool, open(output_path, "wb") as out, open(audit_path, "w") as audit:
+        while True:
+            # A bounded window of batches keeps memory flat on very large files
+            window = list(islice(batches, workers * 2))
+            if not window:
+                break
+
+            jobs = [(lines, config["min_assistant_chars"]) for lines in window]
+            for lines, features in zip(window, pool.imap(batch_features, jobs)):
+                kept += write_batch(lines, features, config, total, out, audit, counts)
+                total += len(lines)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "rows": total,
+        "kept": kept,
+        "dropped": total - kept,
+        "reasons": dict(counts),
+        "seconds": elapsed,
+        "config": config,
+    }
+
+    print(f"✅ Filtered {total:,} rows in {elapsed:.1f}s: kept {kept:,}, dropped {total - kept:,}")
+    for reason, count in counts.most_common():
+        if count:
+            print(f"   - {reason}: {count:,}")
+    print(f"📝 Audit report: {audit_path}")
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Filter low-quality conversations out of HeySalad training data"
+    )
+    parser.add_argument("--input", type=str, default="./data/training_data.jsonl", help="Input JSONL")
+    parser.add_argument("--output", type=str, default="./data/training_data.filtered.jsonl", help="Filtered JSONL")
+    parser.add_argument("--audit", type=str, default="./data/filter_audit.jsonl", help="Dropped-row audit JSONL")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all CPUs)")
+    for key, value in FILTER_CONFIG.items():
+        parser.add_argument(
+            f"--{key.replace('_', '-')}",
+            type=type(value),
+            default=value,
+            help=f"Threshold (default: {value})"
+        )
+
+    args = parser.parse_args()
+    config = {key: getattr(args, key) for key in FILTER_CONFIG}
+
+    if not os.path.exists(args.input):
+        print(f"❌ Dataset not found at: {args.input}")
+        sys.exit(1)
+
+    filter_dataset(args.input, args.output, args.audit, config, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+HeySalad Training Data Ingestion Service
+Accepts conversations from many concurrent producers and commits them in batches
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from itertools import islice
+from typing import Dict, List, Optional
+
+from collect_training_data import append_records, validate_messages
+
+_CLOSE = object()
+
+
+class IngestionError(Exception):
+    """Raised when one or more sources could not be ingested"""
+
+
+class IngestionService:
+    """Multi-producer front end for a training data JSONL file
+
+    Producers call `submit` (coroutines) or `submit_threadsafe` (threads).
+    Items go through a bounded queue, so fast producers block instead of
+    growing memory, and a single writer task commits them in batches with
+    `append_records`, whose file lock makes several collector processes
+    safe to point at the same dataset. If a commit fails, the writer keeps
+    draining the queue so blocked producers wake up, further submits raise
+    and `close()` re-raises the failure.
+    """
+
+    def __init__(
+        self,
+        output_path: str = "./data/training_data.jsonl",
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        fsync: bool = False,
+    ):
+        self.output_path = output_path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.failure: Optional[Exception] = None
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "rejected": 0}
+
+    async def start(self):
+        """Create the queue and start the writer task on the running loop"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.writer = asyncio.create_task(self._write_loop())
+
+    async def submit(self, messages: List[Dict[str, str]], **fields):
+        """Queue one conversation; waits while the queue is full"""
+        self._raise_if_failed()
+        try:
+            validate_messages(messages)
+        except ValueError:
+            self.stats["rejected"] += 1
+            raise
+        self.stats["submitted"] += 1
+        await self.queue.put({"messages": messages, **fields})
+
+    def _raise_if_failed(self):
+        if self.failure is not None:
+            raise IngestionError(f"writer failed for {self.output_path}: {self.failure}") from self.failure
+
+    async def submit_many(self, records: List[dict]):
+        """Queue several {"messages": ...} records in order"""
+        for record in records:
+            await self.submit(**record)
+
+    def submit_threadsafe(self, messages: List[Dict[str, str]], **fields):
+        """Queue one conversation from another thread, blocking for backpressure"""
+        future = asyncio.run_coroutine_threadsafe(self.submit(messages, **fields), self.loop)
+        future.result()
+
+    def submit_many_threadsafe(self, records: List[dict]):
+        """Queue a chunk of records from another thread with one loop hand-off"""
+        future = asyncio.run_coroutine_threadsafe(self.submit_many(records), self.loop)
+        future.result()
+
+    async def close(self):
+        """Flush everything queued so far and stop the writer"""
+        await self.queue.put(_CLOSE)
+        await self.writer
+        self._raise_if_failed()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _write_loop(self):
+        try:
+            await self._commit_batches()
+        except Exception as e:
+            self.failure = e
+            # Keep consuming so producers blocked on a full queue wake up and see the failure
+            while await self.queue.get() is not _CLOSE:
+                pass
+
+    async def _commit_batches(self):
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is _CLOSE:
+                break
+
+            # Gather a batch: up to batch_size items or flush_interval seconds
+            batch = [item]
+            deadline = self.loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - self.loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+
+            # File I/O and lock waits happen off the event loop
+            await self.loop.run_in_executor(None, append_records, self.output_path, batch, self.fsync)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+
+
+def ingest_files(sources: List[str], output_path: str, **options) -> dict:
+    """Ingest several JSONL sources concurrently, one producer thread per source"""
+
+    async def run():
+        errors = []
+        async with IngestionService(output_path, **options) as service:
+            def produce(path):
+                try:
+                    with open(path) as f:
+                        while True:
+                            lines = list(islice(f, 256))
+                            if not lines:
+                                break
+                            service.submit_many_threadsafe([json.loads(line) for line in lines if line.strip()])
+                except Exception as e:
+                    # Unreadable sources fail the run just like invalid records
+                    errors.append(f"{path}: {e}")
+
+            threads = [threading.Thread(target=produce, args=(path,)) for path in sources]
+            for thread in threads:
+                thread.start()
+            await asyncio.gather(*(asyncio.to_thread(thread.join) for thread in threads))
+
+        if errors:
+            raise IngestionError("; ".join(errors))
+        return service.stats
+
+    start = time.perf_counter()
+    stats = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    rate = stats["written"] / elapsed if elapsed else 0.0
+    print(f"✅ Ingested {stats['written']:,} examples from {len(sources)} sources "
+          f"in {stats['batches']:,} batches ({rate:,.0f}/s)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Append conversations from several JSONL sources to the training data"
+    )
+    parser.add_argument("sources", nargs="+", help="Source JSONL files (one producer each)")
+    parser.add_argument("--output", type=str, default="./data/training_data.jsonl", help="Dataset to append to")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per commit")
+    parser.add_argument("--max-queue", type=int, default=10000, help="Queue bound for backpressure")
+    parser.add_argument("--fsync", action="store_true", help="fsync after every commit")
+
+    args = parser.parse_args()
+
+    try:
+        ingest_files(
+            args.sources,
+            args.output,
+            batch_size=args.batch_size,
+            max_queue=args.max_queue,
+            fsync=args.fsync,
+        )
+    except (IngestionError, OSError) as e:
+        print(f"❌ Ingestion failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+HeySalad Training Pipeline
+Runs collect → filter → tokenize → train → preflight/card → push as cached stages
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+STATE_DIR = Path("./.pipeline")
+
+# Names ignored when hashing a directory: the rendered card is metadata, not weights
+IGNORED_NAMES = {"README.md", "__pycache__", ".git"}
+
+
+class Stage:
+    """A pipeline step with content-addressed inputs and declared outputs
+
+    A stage is skipped when the hash of its input files, its params and its
+    name matches the last successful run and all of its outputs still exist.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[["Stage"], None],
+        inputs: List[str] = (),
+        outputs: List[str] = (),
+        params: Optional[dict] = None,
+        deps: List[str] = (),
+    ):
+        self.name = name
+        self.run = run
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.params = params or {}
+        self.deps = list(deps)
+
+
+class FileHasher:
+    """SHA-256 of files and directories, memoised on (size, mtime)"""
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.cache: Dict[str, list] = {}
+        if cache_path.exists():
+            with open(cache_path) as f:
+                self.cache = json.load(f)
+
+    def hash_file(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(path.resolve())
+        with self.lock:
+            cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        with self.lock:
+            self.cache[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def hash_path(self, path: Path) -> str:
+        if not path.exists():
+            return "missing"
+        if path.is_file():
+            return self.hash_file(path)
+
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+            for name in sorted(files):
+                if name in IGNORED_NAMES:
+                    continue
+                file_path = Path(root) / name
+                digest.update(str(file_path.relative_to(path)).encode())
+                digest.update(self.hash_file(file_path).encode())
+        return digest.hexdigest()
+
+    def save(self):
+        with self.lock:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.cache, f)
+
+
+def stage_key(stage: Stage, hasher: FileHasher) -> str:
+    """Content address of a stage: its name, params and input hashes"""
+    digest = hashlib.sha256(stage.name.encode())
+    digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+    for path in stage.inputs:
+        digest.update(str(path).encode())
+        digest.update(hasher.hash_path(path).encode())
+    return digest.hexdigest()
+
+
+def run_pipeline(stages: List[Stage], jobs: int = 2, force: List[str] = ()) -> List[dict]:
+    """Run stages in dependency order, concurrently where possible
+
+    Returns one report row per stage with its status and wall time.
+    """
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    hasher = FileHasher(STATE_DIR / "hashes.json")
+    report: Dict[str, dict] = {}
+    pending = list(stages)
+    running = {}
+
+    def execute(stage: Stage) -> dict:
+        start = time.perf_counter()
+        key = stage_key(stage, hasher)
+        record_path = STATE_DIR / f"{stage.name}.json"
+        record = {}
+        if record_path.exists():
+            with open(record_path) as f:
+                record = json.load(f)
+
+        cached = (
+            stage.name not in force
+            and record.get("key") == key
+            and all(path.exists() for path in stage.outputs)
+        )
+        if cached:
+            return {"stage": stage.name, "status": "cached", "seconds": time.perf_counter() - start}
+
+        print(f"\n▶️  Running stage: {stage.name}")
+        stage.run(stage)
+
+        missing = [str(path) for path in stage.outputs if not path.exists()]
+        if missing:
+            raise RuntimeError(f"stage '{stage.name}' did not produce: {', '.join(missing)}")
+
+        elapsed = time.perf_counter() - start
+        with open(record_path, "w") as f:
+            json.dump({"key": key, "seconds": elapsed, "finished": time.time()}, f, indent=2)
+        return {"stage": stage.name, "status": "ran", "seconds": elapsed}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for stage in list(pending):
+                dep_status = [report.get(dep, {}).get("status") for dep in stage.deps]
+                if any(status in ("failed", "skipped") for status in dep_status):
+                    report[stage.name] = {"stage": stage.name, "status": "skipped", "seconds": 0.0}
+                    pending.remove(stage)
+                elif all(status in ("ran", "cached") for status in dep_status):
+                    running[pool.submit(execute, stage)] = stage
+                    pending.remove(stage)
+
+            if not running:
+                if pending:
+                    raise RuntimeError(f"unknown dependencies in stages: {[s.name for s in pending]}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    report[stage.name] = future.result()
+                except Exception as e:
+                    print(f"❌ Stage {stage.name} failed: {e}")
+                    report[stage.name] = {"stage": stage.name, "status": "failed", "seconds": 0.0, "error": str(e)}
+
+    hasher.save()
+    rows = [report[stage.name] for stage in stages]
+    with open(STATE_DIR / "report.json", "w") as f:
+        json.dump(rows, f, indent=2)
+    return rows
+
+
+def print_report(rows: List[dict]):
+    """Print the per-stage timing report"""
+    icons = {"ran": "✅", "cached": "♻️ ", "skipped": "⏭️ ", "failed": "❌"}
+    total = sum(row["seconds"] for row in rows)
+
+    print("\n" + "=" * 60)
+    print("  📋 Pipeline Report")
+    print("=" * 60)
+    for row in rows:
+        print(f"   {icons[row['status']]} {row['stage']:<12} {row['status']:<8} {row['seconds']:>9.2f}s")
+    print(f"   {'':<3}{'total':<21} {total:>9.2f}s")
+
+
+def read_config_literal(path: Path, name: str) -> dict:
+    """Read a module-level dict literal without importing its (heavy) module"""
+    tree = ast.parse(path.read_text())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise RuntimeError(f"{name} not found in {path.name}")
+
+
+def local_sources(script: Path) -> List[Path]:
+    """A script plus every sibling module it imports, followed transitively
+
+    Stages hash these so an edit to any helper module (weight cache, CPU
+    backend, manifests, ...) invalidates the stage without a hand-kept list.
+    """
+    seen: Dict[str, Path] = {}
+    pending = [Path(script)]
+    while pending:
+        path = pending.pop()
+        if path.stem in seen:
+            continue
+        seen[path.stem] = path
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = path.parent / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    pending.append(candidate)
+    return sorted(seen.values())
+
+
+def read_train_config() -> dict:
+    """Read the CONFIG literal from train_heysalad.py without importing torch"""
+    return read_config_literal(HERE / "train_heysalad.py", "CONFIG")
+
+
+def run_script(*args: str):
+    """Run one of the training scripts as a subprocess"""
+    subprocess.run([sys.executable, *args], check=True, cwd=os.getcwd())
+
+
+def build_stages(args) -> List[Stage]:
+    """Describe the HeySalad training pipeline"""
+    config = read_train_config()
+    filter_config = read_config_literal(HERE / "filter_training_data.py", "FILTER_CONFIG")
+    dataset = Path(args.dataset)
+    filtered = Path(args.workdir) / "data" / "training_data.filtered.jsonl"
+    audit = Path(args.workdir) / "data" / "filter_audit.jsonl"
+    manifest = Path(args.workdir) / "tokenized" / "manifest.json"
+    model_dir = Path(args.workdir) / config["model_name"]
+    card = model_dir / "README.md"
+
+    def collect(stage):
+        # Only bootstraps the starter dataset; never overwrites collected data
+        if dataset.exists():
+            print(f"📥 Using existing dataset: {dataset}")
+            return
+        run_script(str(HERE / "collect_training_data.py"))
+
+    def filter_rows(stage):
+        from filter_training_data import filter_dataset
+        filter_dataset(str(dataset), str(filtered), str(audit), stage.params)
+
+    def tokenize(stage):
+        from tokenization import tokenize_incremental
+        tokenize_incremental(
+            str(filtered), str(manifest), config["base_model"], config["max_length"],
+            cache_dir=str(STATE_DIR / "tokenized")
+        )
+
+    def train(stage):
+        run_script(
+            str(HERE / "train_heysalad.py"),
+            "--tokenized", str(manifest),
+            "--output-dir", str(model_dir),
+        )
+
+    def preflight(stage):
+        from preflight import run_preflight
+        errors = run_preflight(str(model_dir))
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+    def render_card(stage):
+        from push_to_hub import create_model_card, load_results
+        results = load_results(model_dir, args.results)
+        with open(card, "w") as f:
+            f.write(create_model_card(args.repo, str(model_dir), args.version, results))
+
+    def push(stage):
+        command = [str(HERE / "push_to_hub.py"), "--model", str(model_dir),
+                   "--repo", args.repo, "--version", args.version, "--skip-preflight"]
+        for path in args.results or []:
+            command += ["--results", path]
+        if args.private:
+            command.append("--private")
+        run_script(*command)
+
+    stages = [
+        Stage("collect", collect,
+              inputs=local_sources(HERE / "collect_training_data.py"), outputs=[dataset]),
+        Stage("filter", filter_rows,
+              inputs=[dataset, *local_sources(HERE / "filter_training_data.py")], outputs=[filtered, audit],
+              params=filter_config,
+              deps=["collect"]),
+        Stage("tokenize", tokenize,
+              inputs=[filtered, *local_sources(HERE / "tokenization.py")], outputs=[manifest],
+              params={"base_model": config["base_model"], "max_length": config["max_length"]},
+              deps=["filter"]),
+        Stage("train", train,
+              inputs=[manifest, *local_sources(HERE / "train_heysalad.py")], outputs=[model_dir],
+              deps=["tokenize"]),
+        Stage("preflight", preflight,
+              inputs=[model_dir, *local_sources(HERE / "preflight.py")],
+              deps=["train"]),
+        Stage("card", render_card,
+              inputs=[model_dir / "results.json", *local_sources(HERE / "push_to_hub.py"), *args.results],
+              outputs=[card], params={"repo": args.repo, "version": args.version},
+              deps=["train"]),
+    ]
+
+    if args.push:
+        stages.append(Stage(
+            "push", push,
+            inputs=[model_dir, card], params={"repo": args.repo, "private": args.private},
+            deps=["preflight", "card"],
+        ))
+
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the HeySalad training pipeline, skipping unchanged stages"
+    )
+    parser.add_argument("--dataset", type=str, default="./data/training_data.jsonl", help="Training data JSONL")
+    parser.add_argument("--workdir", type=str, default="./build", help="Where tokenized data and the model go")
+    parser.add_argument("--repo", type=str, default="heysalad/heysalad-7b", help="Hugging Face repository ID")
+    parser.add_argument("--version", type=str, default="v0.1.0", help="Model version")
+    parser.add_argument("--results", type=str, action="append", default=[], help="Extra results JSON for the card")
+    parser.add_argument("--push", action="store_true", help="Also push to the Hugging Face Hub")
+    parser.add_argument("--private", action="store_true", help="Make repository private")
+    parser.add_argument("--force", type=str, action="append", default=[], help="Re-run a stage even if cached")
+    parser.add_argument("--jobs", type=int, default=2, help="Maximum stages run concurrently")
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  🥗 HeySalad Training Pipeline")
+    print("=" * 60)
+
+    rows = run_pipeline(build_stages(args), jobs=args.jobs, force=args.force)
+    print_report(rows)
+
+    if any(row["status"] == "failed" for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
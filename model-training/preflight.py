@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+HeySalad Model Preflight Checks
+Validates a trained model folder before it is published, without loading weights
+"""
+
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Bytes per element for every dtype the safetensors format defines
+SAFETENSORS_DTYPES = {
+    "BOOL": 1, "U8": 1, "I8": 1, "F8_E4M3": 1, "F8_E5M2": 1,
+    "U16": 2, "I16": 2, "F16": 2, "BF16": 2,
+    "U32": 4, "I32": 4, "F32": 4,
+    "U64": 8, "I64": 8, "F64": 8,
+}
+
+FLOAT_DTYPES = {"F8_E4M3", "F8_E5M2", "F16", "BF16", "F32", "F64"}
+
+# Headers larger than this are certainly corrupt (the reference loader uses the same cap)
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+# Projections whose LoRA input / output dimension equals the base hidden size
+HIDDEN_INPUT_MODULES = {"q_proj", "k_proj", "v_proj", "gate_proj", "up_proj"}
+HIDDEN_OUTPUT_MODULES = {"o_proj", "down_proj"}
+
+
+class PreflightError(Exception):
+    """Raised when a model folder fails preflight validation"""
+
+
+def read_safetensors_header(path: Path) -> Dict[str, dict]:
+    """Parse and validate a safetensors header through mmap
+
+    Only the header pages are touched, so this costs the same for a 10 MB
+    adapter and a 10 GB shard. Returns a mapping of tensor name to
+    {"dtype", "shape", "data_offsets"}.
+    """
+    size = path.stat().st_size
+    if size < 8:
+        raise PreflightError(f"{path.name}: file is truncated ({size} bytes)")
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        (header_size,) = struct.unpack("<Q", mm[:8])
+        if header_size > MAX_HEADER_SIZE or 8 + header_size > size:
+            raise PreflightError(f"{path.name}: header length {header_size} exceeds file size {size}")
+        try:
+            header = json.loads(mm[8:8 + header_size])
+        except ValueError as e:
+            raise PreflightError(f"{path.name}: header is not valid JSON ({e})")
+
+    if not isinstance(header, dict):
+        raise PreflightError(f"{path.name}: header is not a JSON object")
+
+    header.pop("__metadata__", None)
+    data_size = size - 8 - header_size
+    end_max = 0
+
+    for name, info in header.items():
+        if not isinstance(info, dict):
+            raise PreflightError(f"{path.name}: tensor '{name}' entry is not a JSON object")
+        dtype = info.get("dtype")
+        shape = info.get("shape")
+        offsets = info.get("data_offsets")
+
+        if dtype not in SAFETENSORS_DTYPES:
+            raise PreflightError(f"{path.name}: tensor '{name}' has unknown dtype {dtype!r}")
+        if not isinstance(shape, list) or not all(isinstance(d, int) and d >= 0 for d in shape):
+            raise PreflightError(f"{path.name}: tensor '{name}' has invalid shape {shape!r}")
+        if (not isinstance(offsets, list) or len(offsets) != 2
+                or not all(isinstance(o, int) and o >= 0 for o in offsets) or offsets[0] > offsets[1]):
+            raise PreflightError(f"{path.name}: tensor '{name}' has invalid offsets {offsets!r}")
+
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        expected = numel * SAFETENSORS_DTYPES[dtype]
+        if offsets[1] - offsets[0] != expected:
+            raise PreflightError(
+                f"{path.name}: tensor '{name}' spans {offsets[1] - offsets[0]} bytes, "
+                f"expected {expected} for {dtype}{shape}"
+            )
+        if offsets[1] > data_size:
+            raise PreflightError(f"{path.name}: tensor '{name}' points past end of file (truncated upload?)")
+        end_max = max(end_max, offsets[1])
+
+    if end_max != data_size:
+        raise PreflightError(f"{path.name}: {data_size - end_max} trailing bytes not owned by any tensor")
+
+    return header
+
+
+def collect_tensors(model_path: Path, errors: List[str]) -> Dict[str, dict]:
+    """Read every safetensors file in the folder, honouring a shard index if present"""
+    tensors: Dict[str, dict] = {}
+
+    index_files = sorted(model_path.glob("*.safetensors.index.json"))
+    indexed_shards = set()
+
+    for index_path in index_files:
+        try:
+            with open(index_path) as f:
+                weight_map = json.load(f).get("weight_map", {})
+        except ValueError as e:
+            errors.append(f"{index_path.name}: not valid JSON ({e})")
+            continue
+
+        if not weight_map:
+            errors.append(f"{index_path.name}: empty weight_map")
+            continue
+
+        shards: Dict[str, set] = {}
+        for name, shard in weight_map.items():
+            shards.setdefault(shard, set()).add(name)
+
+        for shard, names in sorted(shards.items()):
+            indexed_shards.add(shard)
+            shard_path = model_path / shard
+            if not shard_path.exists():
+                errors.append(f"{index_path.name}: shard {shard} is missing ({len(names)} tensors)")
+                continue
+            try:
+                header = read_safetensors_header(shard_path)
+            except PreflightError as e:
+                errors.append(str(e))
+                continue
+
+            missing = names - header.keys()
+            unlisted = header.keys() - names
+            if missing:
+                errors.append(f"{shard}: {len(missing)} indexed tensors absent, e.g. {sorted(missing)[0]}")
+            if unlisted:
+                errors.append(f"{shard}: {len(unlisted)} tensors not in index, e.g. {sorted(unlisted)[0]}")
+            tensors.update(header)
+
+    for path in sorted(model_path.glob("*.safetensors")):
+        if path.name in indexed_shards:
+            continue
+        try:
+            tensors.update(read_safetensors_header(path))
+        except PreflightError as e:
+            errors.append(str(e))
+
+    return tensors
+
+
+def check_adapter(model_path: Path, tensors: Dict[str, dict], base_config: Optional[dict], errors: List[str]):
+    """Check LoRA tensor names, ranks and shapes against adapter_config.json"""
+    with open(model_path / "adapter_config.json") as f:
+        adapter_config = json.load(f)
+
+    rank = adapter_config.get("r")
+    rank_pattern = adapter_config.get("rank_pattern") or {}
+    target_modules = adapter_config.get("target_modules") or []
+    if isinstance(target_modules, str):
+        # A regex pattern; module names cannot be checked against it directly
+        target_modules = []
+
+    hidden_size = (base_config or {}).get("hidden_size")
+    num_layers = (base_config or {}).get("num_hidden_layers")
+
+    lora_a: Dict[str, dict] = {}
+    lora_b: Dict[str, dict] = {}
+    for name, info in tensors.items():
+        if ".lora_A." in name:
+            lora_a[name.split(".lora_A.")[0]] = info
+        elif ".lora_B." in name:
+            lora_b[name.split(".lora_B.")[0]] = info
+
+    if not lora_a:
+        errors.append("adapter_model.safetensors: no LoRA tensors found")
+        return
+
+    for module in sorted(lora_a.keys() ^ lora_b.keys()):
+        errors.append(f"{module}: has only one of lora_A / lora_B")
+
+    seen_targets = set()
+    for module in sorted(lora_a.keys() & lora_b.keys()):
+        a, b = lora_a[module], lora_b[module]
+        leaf = module.rsplit(".", 1)[-1]
+        seen_targets.add(leaf)
+
+        for info in (a, b):
+            if info["dtype"] not in FLOAT_DTYPES:
+                errors.append(f"{module}: LoRA weight has non-float dtype {info['dtype']}")
+        if len(a["shape"]) != 2 or len(b["shape"]) != 2:
+            errors.append(f"{module}: LoRA weights must be 2-D, got {a['shape']} and {b['shape']}")
+            continue
+
+        expected_rank = next((r for key, r in rank_pattern.items() if module.endswith(key)), rank)
+        if a["shape"][0] != b["shape"][1]:
+            errors.append(f"{module}: lora_A {a['shape']} and lora_B {b['shape']} disagree on rank")
+        elif expected_rank is not None and a["shape"][0] != expected_rank:
+            errors.append(f"{module}: rank {a['shape'][0]} does not match adapter_config r={expected_rank}")
+
+        if target_modules and leaf not in target_modules:
+            errors.append(f"{module}: not in adapter_config target_modules")
+
+        if hidden_size:
+            if leaf in HIDDEN_INPUT_MODULES and a["shape"][1] != hidden_size:
+                errors.append(f"{module}: input dim {a['shape'][1]} != base hidden_size {hidden_size}")
+            if leaf in HIDDEN_OUTPUT_MODULES and b["shape"][0] != hidden_size:
+                errors.append(f"{module}: output dim {b['shape'][0]} != base hidden_size {hidden_size}")
+
+        if num_layers:
+            layer = _layer_index(module)
+            if layer is not None and layer >= num_layers:
+                errors.append(f"{module}: layer {layer} exceeds base num_hidden_layers={num_layers}")
+
+    for target in target_modules:
+        if target not in seen_targets:
+            errors.append(f"adapter_config target module '{target}' has no LoRA weights")
+
+
+def check_full_model(tensors: Dict[str, dict], config: dict, errors: List[str]):
+    """Check a merged (non-adapter) checkpoint against its config.json"""
+    vocab_size = config.get("vocab_size")
+    hidden_size = config.get("hidden_size")
+    num_layers = config.get("num_hidden_layers")
+
+    for name, info in tensors.items():
+        if name.endswith("embed_tokens.weight") and vocab_size and hidden_size:
+            if info["shape"] != [vocab_size, hidden_size]:
+                errors.append(f"{name}: shape {info['shape']} != [{vocab_size}, {hidden_size}] from config.json")
+        layer = _layer_index(name)
+        if num_layers and layer is not None and layer >= num_layers:
+            errors.append(f"{name}: layer {layer} exceeds num_hidden_layers={num_layers}")
+
+    if num_layers:
+        layers = {_layer_index(name) for name in tensors} - {None}
+        missing = set(range(num_layers)) - layers
+        if missing:
+            errors.append(f"config.json declares {num_layers} layers but {len(missing)} have no weights")
+
+
+def check_tokenizer(model_path: Path, errors: List[str]):
+    """Verify the tokenizer files a chat-template load needs are present and parse"""
+    config_path = model_path / "tokenizer_config.json"
+    if not config_path.exists():
+        errors.append("tokenizer_config.json is missing")
+    else:
+        try:
+            with open(config_path) as f:
+                json.load(f)
+        except ValueError as e:
+            errors.append(f"tokenizer_config.json: not valid JSON ({e})")
+
+    fast = model_path / "tokenizer.json"
+    slow = model_path / "tokenizer.model"
+    if fast.exists():
+        try:
+            with open(fast) as f:
+                tokenizer = json.load(f)
+            if not tokenizer.get("model", {}).get("vocab"):
+                errors.append("tokenizer.json: model vocab is empty")
+        except ValueError as e:
+            errors.append(f"tokenizer.json: not valid JSON ({e})")
+    elif not slow.exists() or slow.stat().st_size == 0:
+        errors.append("no tokenizer.json or tokenizer.model found")
+
+    special_path = model_path / "special_tokens_map.json"
+    if special_path.exists():
+        try:
+            with open(special_path) as f:
+                json.load(f)
+        except ValueError as e:
+            errors.append(f"special_tokens_map.json: not valid JSON ({e})")
+
+
+def _layer_index(name: str) -> Optional[int]:
+    """Extract N from '...layers.N...' tensor names"""
+    parts = name.split(".")
+    for i, part in enumerate(parts[:-1]):
+        if part in ("layers", "h", "blocks") and parts[i + 1].isdigit():
+            return int(parts[i + 1])
+    return None
+
+
+def _load_json(path: Optional[Path]) -> Optional[dict]:
+    if path and path.exists():
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+def run_preflight(model_path: str, base_config_path: Optional[str] = None) -> List[str]:
+    """Validate a model folder and return a list of problems (empty if it is publishable)"""
+    model_path = Path(model_path)
+    errors: List[str] = []
+
+    if not model_path.is_dir():
+        return [f"{model_path} is not a directory"]
+
+    tensors = collect_tensors(model_path, errors)
+    has_safetensors = any(model_path.glob("*.safetensors"))
+    pickled = sorted(p.name for p in model_path.glob("*.bin"))
+
+    if not has_safetensors and not pickled:
+        errors.append("no weight files (*.safetensors or *.bin) found")
+    elif pickled and not has_safetensors:
+        print(f"⚠️  Only pickled weights found ({', '.join(pickled)}); tensor checks skipped")
+
+    try:
+        base_config = _load_json(Path(base_config_path) if base_config_path else model_path / "config.json")
+        if (model_path / "adapter_config.json").exists():
+            if tensors:
+                check_adapter(model_path, tensors, base_config, errors)
+        elif base_config is None:
+            errors.append("neither adapter_config.json nor config.json found")
+        elif tensors:
+            check_full_model(tensors, base_config, errors)
+    except ValueError as e:
+        errors.append(f"config file is not valid JSON ({e})")
+
+    check_tokenizer(model_path, errors)
+
+    return errors
+
+
+def preflight_or_exit(model_path: str, base_config_path: Optional[str] = None):
+    """Run preflight checks, print a report and exit on failure"""
+    print("\n🔍 Running preflight checks...")
+    start = time.perf_counter()
+    errors = run_preflight(model_path, base_config_path)
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        print(f"❌ Preflight failed in {elapsed:.2f}s with {len(errors)} problem(s):")
+        for error in errors:
+            print(f"   - {error}")
+        sys.exit(1)
+
+    print(f"✅ Preflight passed in {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate a HeySalad model folder without loading weights"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        required=True,
+        help="Path to the trained model"
+    )
+    parser.add_argument(
+        "--base-config",
+        type=str,
+        default=None,
+        help="Path to the base model config.json (default: <model>/config.json if present)"
+    )
+
+    args = parser.parse_args()
+    preflight_or_exit(args.model, args.base_config)
+
+if __name__ == "__main__":
+    main()
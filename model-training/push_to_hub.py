@@ -5,13 +5,168 @@ Push HeySalad Model to Hugging Face Hub
 
 import os
 import sys
+import json
 import argparse
 from pathlib import Path
+from typing import List, Optional
 from huggingface_hub import HfApi, create_repo, upload_folder
-from transformers import AutoModelForCausalLM, AutoTokenizer
-
-def create_model_card(repo_id: str, model_path: str, version: str) -> str:
+from preflight import preflight_or_exit
+
+RESULTS_FILENAME = "results.json"
+
+def load_results(model_path: Path, extra_paths: List[str] = None) -> dict:
+    """Load and merge measured results files
+
+    Training writes <model>/results.json; evaluation and benchmark runs can
+    supply further files. Results are merged section by section, with eval
+    entries concatenated and later files winning for other keys.
+    """
+    paths = [model_path / RESULTS_FILENAME] + [Path(p) for p in extra_paths or []]
+    merged = {"eval": [], "training": {}, "inference": {}}
+
+    for path in paths:
+        if not path.exists():
+            continue
+        with open(path) as f:
+            data = json.load(f)
+        merged["eval"].extend(data.get("eval", []))
+        merged["training"].update(data.get("training", {}))
+        merged["inference"].update(data.get("inference", {}))
+        print(f"📊 Loaded results: {path}")
+
+    return merged
+
+def _fmt(value, digits: int = 4) -> str:
+    """Format a measured number for the model card"""
+    if isinstance(value, float):
+        return f"{value:,.{digits}g}" if abs(value) < 1000 else f"{value:,.0f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+def resolve_base_model(model_path: str, results: dict) -> Optional[str]:
+    """Base model recorded by training, else the adapter config's, else None"""
+    base_model = results.get("training", {}).get("base_model")
+    if base_model:
+        return base_model
+    config_path = Path(model_path) / "adapter_config.json"
+    if config_path.exists():
+        with open(config_path) as f:
+            return json.load(f).get("base_model_name_or_path")
+    return None
+
+def render_model_index(repo_id: str, results: dict) -> str:
+    """Render eval scores as Hugging Face model-index metadata
+
+    The schema requires a dataset and a value per result, so entries
+    without one are left to the Performance section.
+    """
+    evals = [entry for entry in results.get("eval", []) if entry.get("dataset") and entry.get("value") is not None]
+    if not evals:
+        return ""
+
+    lines = [
+        "model-index:",
+        f"- name: {json.dumps(repo_id.split('/')[-1])}",
+        "  results:",
+    ]
+    for entry in evals:
+        dataset = entry["dataset"]
+        lines.extend([
+            "  - task:",
+            "      type: text-generation",
+            "    dataset:",
+            f"      name: {json.dumps(dataset)}",
+            f"      type: {json.dumps(dataset)}",
+            "    metrics:",
+            f"    - type: {json.dumps(entry.get('metric', 'score'))}",
+            f"      value: {json.dumps(entry['value'])}",
+            f"      name: {json.dumps(entry['task'])}",
+        ])
+    return "\n".join(lines) + "\n"
+
+def render_performance(results: dict) -> str:
+    """Render the Performance section from measured results only"""
+    evals = results.get("eval", [])
+    training = results.get("training", {})
+    inference = results.get("inference", {})
+
+    sections = ["## Performance", ""]
+
+    if not (evals or training or inference):
+        sections.append(
+            "No measured results were supplied with this release. "
+            "Evaluate the model on your own tasks before relying on it."
+        )
+        return "\n".join(sections) + "\n"
+
+    if evals:
+        sections.extend(["### Evaluation", "", "| Task | Metric | Score | Dataset |", "|------|--------|-------|---------|"])
+        for entry in evals:
+            sections.append(
+                f"| {entry['task']} | {entry.get('metric', 'score')} | {_fmt(entry['value'])} "
+                f"| {entry.get('dataset', '-')} |"
+            )
+        sections.append("")
+
+    if inference:
+        sections.extend(["### Inference", "", "| Measurement | Value |", "|-------------|-------|"])
+        if "tokens_per_sec" in inference:
+            sections.append(f"| Throughput | {_fmt(inference['tokens_per_sec'])} tokens/sec |")
+        for percentile, value in sorted(inference.get("latency_ms", {}).items()):
+            sections.append(f"| Latency {percentile} | {_fmt(value)} ms |")
+        if "peak_memory_gb" in inference:
+            sections.append(f"| Peak memory | {_fmt(inference['peak_memory_gb'], 3)} GB |")
+        if "hourly_cost_usd" in inference and inference.get("tokens_per_sec"):
+            cost = inference["hourly_cost_usd"] / (inference["tokens_per_sec"] * 3600) * 1_000_000
+            sections.append(f"| Cost per 1M tokens | ${cost:,.2f} (at ${_fmt(inference['hourly_cost_usd'])}/hour) |")
+        if "hardware" in inference:
+            sections.append(f"| Hardware | {inference['hardware']} |")
+        sections.append("")
+
+    if training:
+        sections.extend(["### Training", "", "| Measurement | Value |", "|-------------|-------|"])
+        if "train_tokens" in training:
+            sections.append(f"| Training tokens | {_fmt(training['train_tokens'])} |")
+        if "train_runtime_s" in training:
+            sections.append(f"| Wall time | {training['train_runtime_s'] / 3600:.2f} hours |")
+        if "tokens_per_sec" in training:
+            sections.append(f"| Throughput | {_fmt(training['tokens_per_sec'])} tokens/sec |")
+        if "peak_memory_gb" in training:
+            sections.append(f"| Peak memory | {_fmt(training['peak_memory_gb'], 3)} GB |")
+        if "train_loss" in training:
+            sections.append(f"| Final training loss | {_fmt(training['train_loss'])} |")
+        if training.get("model_load_s") is not None:
+            sections.append(f"| Base model load | {_fmt(training['model_load_s'])} s (weight cache: {training.get('weight_cache', 'off')}) |")
+        if training.get("time_to_first_step_s") is not None:
+            sections.append(f"| Time to first step | {_fmt(training['time_to_first_step_s'])} s |")
+        if "hardware" in training:
+            sections.append(f"| Hardware | {training['hardware']} |")
+        sections.append("")
+
+    return "\n".join(sections)
+
+def create_model_card(repo_id: str, model_path: str, version: str, results: dict = None) -> str:
     """Create a comprehensive model card"""
+    results = results or {}
+    model_index = render_model_index(repo_id, results)
+    performance = render_performance(results)
+    base_model = resolve_base_model(model_path, results)
+    base_model_meta = f"base_model: {base_model}\n" if base_model else ""
+    fine_tuned_from = f"fine-tuned from {base_model}" if base_model else "fine-tuned"
+
+    # Only state what was recorded: base model and size come from the training run
+    details = ["- **Developed by:** HeySalad", "- **Model type:** Causal language model"]
+    if base_model:
+        details.append(f"- **Base model:** {base_model}")
+    details.append("- **Training method:** LoRA fine-tuning")
+    base_params = results.get("training", {}).get("base_params")
+    if base_params:
+        details.append(f"- **Parameters:** {base_params / 1e9:.2f} billion (base)")
+    details.append(f"- **Version:** {version}")
+    details.extend(["- **License:** Apache 2.0", "- **Language:** English"])
+    model_details = "\n".join(details)
+
     return f"""---
 language:
 - en
@@ -24,9 +179,8 @@ tags:
 - fine-tuned
 datasets:
 - heysalad/training-data
-base_model: meta-llama/Llama-2-7b-chat-hf
-pipeline_tag: text-generation
----
+{base_model_meta}pipeline_tag: text-generation
+{model_index}---
 
 # HeySalad-7B
 
@@ -37,7 +191,7 @@ pipeline_tag: text-generation
 
 ## Model Description
 
-**HeySalad-7B** is a specialized language model fine-tuned from Llama 2 7B for workflow automation,
+**HeySalad-7B** is a specialized language model {fine_tuned_from} for workflow automation,
 business process optimization, and API integration tasks. It's optimized for:
 
 - 🔄 Workflow automation guidance
@@ -87,14 +241,7 @@ const response = await client.chat({{
 
 ## Model Details
 
-- **Developed by:** HeySalad
-- **Model type:** Causal language model
-- **Base model:** Llama 2 7B Chat
-- **Training method:** LoRA fine-tuning
-- **Parameters:** 7 billion
-- **Version:** {version}
-- **License:** Apache 2.0
-- **Language:** English
+{model_details}
 
 ## Training Data
 
@@ -105,26 +252,7 @@ HeySalad-7B was trained on a curated dataset of:
 - HeySalad platform documentation
 - Synthetic instruction-following data
 
-## Performance
-
-| Task | Score |
-|------|-------|
-| Workflow Automation | 92% |
-| API Integration Help | 88% |
-| Code Generation | 85% |
-| General Q&A | 83% |
-
-## Cost Efficiency
-
-Running HeySalad-7B is **70-98% cheaper** than proprietary models:
-
-| Model | Cost (per 1M tokens) | Use Case |
-|-------|---------------------|----------|
-| HeySalad-7B (self-hosted) | $0.10 | Production |
-| HeySalad-7B (HF API) | $0.60 | Pay-as-you-go |
-| GPT-3.5 Turbo | $2.00 | Comparison |
-| GPT-4 | $30.00 | Comparison |
-
+{performance}
 ## Self-Hosting
 
 Deploy on your infrastructure with vLLM:
@@ -207,7 +335,10 @@ def push_model_to_hub(
     repo_id: str,
     version: str = "v0.1.0",
     private: bool = False,
-    token: str = None
+    token: str = None,
+    preflight: bool = True,
+    base_config: str = None,
+    results_paths: List[str] = None
 ):
     """Push model to Hugging Face Hub"""
 
@@ -225,6 +356,10 @@ def push_model_to_hub(
     print(f"🔢 Version: {version}")
     print(f"🔒 Private: {private}")
 
+    # Validate artifacts before anything goes over the network
+    if preflight:
+        preflight_or_exit(str(model_path), base_config)
+
     # Initialize Hugging Face API
     api = HfApi(token=token)
 
@@ -243,7 +378,8 @@ def push_model_to_hub(
 
     # Create model card
     print("\n📄 Creating model card...")
-    model_card = create_model_card(repo_id, str(model_path), version)
+    results = load_results(model_path, results_paths)
+    model_card = create_model_card(repo_id, str(model_path), version, results)
 
     model_card_path = model_path / "README.md"
     with open(model_card_path, "w") as f:
@@ -321,6 +457,24 @@ def main():
         default=None,
         help="Hugging Face token (or use HF_TOKEN env var)"
     )
+    parser.add_argument(
+        "--base-config",
+        type=str,
+        default=None,
+        help="Base model config.json used to check adapter shapes"
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        action="append",
+        default=None,
+        help="Extra eval/benchmark results JSON to render into the card (repeatable)"
+    )
+    parser.add_argument(
+        "--skip-preflight",
+        action="store_true",
+        help="Skip artifact validation before upload"
+    )
 
     args = parser.parse_args()
 
@@ -337,7 +491,10 @@ def main():
         repo_id=args.repo,
         version=args.version,
         private=args.private,
-        token=token
+        token=token,
+        preflight=not args.skip_preflight,
+        base_config=args.base_config,
+        results_paths=args.results
     )
 
 if __name__ == "__main__":
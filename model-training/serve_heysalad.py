@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+"""
+HeySalad Local Inference Server
+OpenAI-compatible /v1/chat/completions over one base model with LoRA adapters loaded on demand
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import select
+import socket
+import argparse
+import threading
+import contextlib
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import torch
+from transformers import AutoModelForCausalLM
+from peft import PeftModel
+
+from cpu_backend import configure_cpu_threads, cpu_supports_bf16
+from tokenization import load_tokenizer
+from weight_cache import load_cached_model
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # older transformers take the legacy tuple cache directly
+    DynamicCache = None
+
+SERVE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    "max_batch_size": 8,        # sequences decoded together
+    "batch_wait_ms": 10,        # how long an idle engine waits to fill a new batch
+    "max_loaded_adapters": 4,   # LRU capacity; least recently used adapter is unloaded
+    "max_context": 4096,        # prompt + completion tokens
+    "default_max_tokens": 512,
+    "default_temperature": 0.7,
+    "disconnect_poll_s": 0.5,   # how often a waiting request checks whether its client hung up
+}
+
+
+class AdapterCache:
+    """LRU of LoRA adapters attached to one shared base model
+
+    Only the engine thread touches it, and adapters are only swapped between
+    batches, so the model never changes under a running forward pass.
+    """
+
+    def __init__(self, base_model, registry: Dict[str, str], capacity: int):
+        self.base = base_model
+        self.registry = registry
+        self.capacity = max(1, capacity)
+        self.peft: Optional[PeftModel] = None
+        self.loaded: "OrderedDict[str, str]" = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+
+    def activate(self, name: Optional[str]):
+        """Make `name` (None for the bare base) the active adapter
+
+        Returns the model to call and a context manager factory to wrap each
+        forward in (disabling adapters for bare-base requests).
+        """
+        if name is None:
+            if self.peft is None:
+                return self.base, contextlib.nullcontext
+            return self.peft, self.peft.disable_adapter
+
+        if name in self.loaded:
+            self.loaded.move_to_end(name)
+        else:
+            if len(self.loaded) >= self.capacity:
+                evicted, _ = self.loaded.popitem(last=False)
+                self.peft.base_model.delete_adapter(evicted)
+                self.evictions += 1
+                print(f"♻️  Unloaded adapter: {evicted}")
+
+            start = time.perf_counter()
+            path = self.registry[name]
+            if self.peft is None:
+                self.peft = PeftModel.from_pretrained(self.base, path, adapter_name=name)
+                self.peft.eval()
+            else:
+                self.peft.load_adapter(path, adapter_name=name)
+            self.loaded[name] = path
+            self.loads += 1
+            print(f"📥 Loaded adapter {name} in {time.perf_counter() - start:.2f}s")
+
+        self.peft.set_adapter(name)
+        return self.peft, contextlib.nullcontext
+
+
+class Sequence:
+    """One chat completion request being generated"""
+
+    def __init__(self, adapter: Optional[str], prompt_ids: List[int], max_tokens: int,
+                 temperature: float, top_p: float, stop: List[str]):
+        self.adapter = adapter
+        self.prompt_ids = prompt_ids
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop = stop
+        self.events: "queue.Queue" = queue.Queue()
+        self.generated: List[int] = []
+        self.text = ""
+        self.sent = 0
+        self.pending: Optional[int] = None
+        self.finish_reason: Optional[str] = None
+        self.cancelled = False
+
+
+def sample_token(logits: torch.Tensor, temperature: float, top_p: float) -> int:
+    """Greedy at temperature 0, otherwise temperature + nucleus sampling"""
+    if temperature <= 0:
+        return int(logits.argmax())
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    if top_p < 1.0:
+        sorted_probs, order = probs.sort(descending=True)
+        # Keep the smallest prefix whose mass reaches top_p (always at least one token)
+        cutoff = sorted_probs.cumsum(-1) - sorted_probs >= top_p
+        sorted_probs[cutoff] = 0.0
+        return int(order[torch.multinomial(sorted_probs, 1)])
+    return int(torch.multinomial(probs, 1))
+
+
+def _pad_cache_left(cache, n: int):
+    """Prepend n empty positions to every layer of a legacy (k, v) cache"""
+    if n == 0:
+        return cache
+    padded = []
+    for k, v in cache:
+        pad = k.new_zeros(k.shape[0], k.shape[1], n, k.shape[3])
+        padded.append((torch.cat([pad, k], dim=2), torch.cat([pad, v], dim=2)))
+    return tuple(padded)
+
+
+class BatchEngine:
+    """Continuous batching decoder running on a single background thread
+
+    Requests join the running batch between decode steps: they are prefilled
+    on their own (left-padded), their KV cache is aligned with the batch's,
+    and from then on every step decodes one token for all rows at once.
+    Finished rows leave immediately. A batch serves one adapter at a time
+    because PEFT activates a single adapter per forward, so requests are
+    admitted in FIFO order while they match the running batch's adapter.
+    """
+
+    def __init__(self, adapters: AdapterCache, tokenizer, device: str, config: dict):
+        self.adapters = adapters
+        self.tokenizer = tokenizer
+        self.device = device
+        self.config = config
+        self.eos_ids = self._eos_ids()
+        # Fast tokenizers are not safe to share across threads without a lock
+        self.tokenizer_lock = threading.Lock()
+
+        self.incoming: "queue.Queue[Sequence]" = queue.Queue()
+        self.waiting: "deque[Sequence]" = deque()
+        self.rows: List[Sequence] = []
+        self.cache = None
+        self.mask: Optional[torch.Tensor] = None
+        self.batch_adapter: Optional[str] = None
+        self.joining: List[Sequence] = []
+        self.model = None
+        self.adapter_context = contextlib.nullcontext
+
+        self.stats = {"requests": 0, "completion_tokens": 0, "decode_steps": 0, "batched_rows": 0}
+        self.thread = threading.Thread(target=self._run, name="batch-engine", daemon=True)
+
+    def _eos_ids(self) -> set:
+        ids = {self.tokenizer.eos_token_id}
+        config_eos = getattr(self.adapters.base.generation_config, "eos_token_id", None)
+        if isinstance(config_eos, int):
+            ids.add(config_eos)
+        elif config_eos:
+            ids.update(config_eos)
+        return {i for i in ids if i is not None}
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, seq: Sequence) -> Sequence:
+        self.stats["requests"] += 1
+        self.incoming.put(seq)
+        return seq
+
+    # Engine thread
+
+    def _run(self):
+        with torch.inference_mode():
+            while True:
+                self._collect(block=not self.rows and not self.waiting)
+                try:
+                    self._admit()
+                    if self.rows:
+                        self._decode_step()
+                except Exception as e:
+                    self._fail(e)
+
+    def _fail(self, error: Exception):
+        """Fail every in-flight request and reset the batch, keeping the server up"""
+        print(f"❌ Generation failed: {error}")
+        for seq in self.rows + self.joining:
+            seq.events.put(("error", str(error)))
+        self.rows, self.joining = [], []
+        self.cache, self.mask = None, None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _collect(self, block: bool):
+        """Move newly submitted requests to the waiting queue"""
+        if block:
+            self.waiting.append(self.incoming.get())
+            # Give concurrent requests a moment to arrive so they share the first batch
+            deadline = time.perf_counter() + self.config["batch_wait_ms"] / 1000
+            while len(self.waiting) < self.config["max_batch_size"]:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    self.waiting.append(self.incoming.get(timeout=timeout))
+                except queue.Empty:
+                    break
+        while True:
+            try:
+                self.waiting.append(self.incoming.get_nowait())
+            except queue.Empty:
+                break
+
+    def _admit(self):
+        """Prefill waiting requests for the running adapter and merge them into the batch"""
+        while self.waiting and self.waiting[0].cancelled:
+            self.waiting.popleft()
+        if not self.waiting:
+            return
+
+        if not self.rows:
+            # Batch drained: switch to whichever adapter the oldest request needs
+            self.batch_adapter = self.waiting[0].adapter
+            self.cache, self.mask = None, None
+            try:
+                self.model, self.adapter_context = self.adapters.activate(self.batch_adapter)
+            except Exception as e:
+                # A broken adapter fails only the requests waiting for it
+                print(f"❌ Could not load adapter {self.batch_adapter}: {e}")
+                for seq in [s for s in self.waiting if s.adapter == self.batch_adapter]:
+                    self.waiting.remove(seq)
+                    seq.events.put(("error", f"Could not load adapter {self.batch_adapter}: {e}"))
+                return
+
+        joining = self.joining = []
+        while (self.waiting and self.waiting[0].adapter == self.batch_adapter
+               and len(self.rows) + len(joining) < self.config["max_batch_size"]):
+            seq = self.waiting.popleft()
+            if not seq.cancelled:
+                joining.append(seq)
+        if not joining:
+            return
+
+        length = max(len(seq.prompt_ids) for seq in joining)
+        input_ids = torch.full((len(joining), length), self.tokenizer.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(joining), length), dtype=torch.long)
+        for i, seq in enumerate(joining):
+            input_ids[i, length - len(seq.prompt_ids):] = torch.tensor(seq.prompt_ids)
+            mask[i, length - len(seq.prompt_ids):] = 1
+        input_ids, mask = input_ids.to(self.device), mask.to(self.device)
+
+        logits, cache = self._forward(input_ids, mask, None)
+        for i, seq in enumerate(joining):
+            self._accept(seq, sample_token(logits[i], seq.temperature, seq.top_p))
+
+        # Align the new rows' cache with the running batch by left-padding the shorter one
+        if self.cache is None:
+            self.cache, self.mask = cache, mask
+        else:
+            old, new = self.mask.shape[1], mask.shape[1]
+            self.cache = tuple(
+                (torch.cat([ko, kn], dim=0), torch.cat([vo, vn], dim=0))
+                for (ko, vo), (kn, vn) in zip(_pad_cache_left(self.cache, max(0, new - old)),
+                                              _pad_cache_left(cache, max(0, old - new)))
+            )
+            self.mask = torch.cat([
+                torch.nn.functional.pad(self.mask, (max(0, new - old), 0)),
+                torch.nn.functional.pad(mask, (max(0, old - new), 0)),
+            ], dim=0)
+        self.rows.extend(joining)
+        self.joining = []
+        self._drop_finished()
+
+    def _forward(self, input_ids, mask, cache):
+        """Run the model; returns last-position logits and the legacy KV cache"""
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)[:, -input_ids.shape[1]:]
+        if cache is not None and DynamicCache is not None:
+            cache = DynamicCache.from_legacy_cache(cache)
+        with self.adapter_context():
+            out = self.model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=cache,
+                use_cache=True,
+            )
+        cache = out.past_key_values
+        if hasattr(cache, "to_legacy_cache"):
+            cache = cache.to_legacy_cache()
+        return out.logits[:, -1, :], cache
+
+    def _decode_step(self):
+        """Feed every row its pending token and sample the next one"""
+        input_ids = torch.tensor([[seq.pending] for seq in self.rows], device=self.device)
+        self.mask = torch.cat([self.mask, self.mask.new_ones((len(self.rows), 1))], dim=1)
+
+        logits, self.cache = self._forward(input_ids, self.mask, self.cache)
+        self.stats["decode_steps"] += 1
+        self.stats["batched_rows"] += len(self.rows)
+
+        for i, seq in enumerate(self.rows):
+            self._accept(seq, sample_token(logits[i], seq.temperature, seq.top_p))
+        self._drop_finished()
+
+    def _accept(self, seq: Sequence, token: int):
+        """Record a sampled token, stream the new text and decide whether seq is finished"""
+        if seq.cancelled:
+            seq.finish_reason = "cancelled"
+            return
+        if token in self.eos_ids:
+            seq.finish_reason = "stop"
+        else:
+            seq.generated.append(token)
+            seq.pending = token
+            self.stats["completion_tokens"] += 1
+            with self.tokenizer_lock:
+                text = self.tokenizer.decode(seq.generated, skip_special_tokens=True)
+            # Wait for multi-byte characters split across tokens to complete
+            if not text.endswith("�"):
+                seq.text = text
+            for stop in seq.stop:
+                index = seq.text.find(stop)
+                if index != -1:
+                    seq.text = seq.text[:index]
+                    seq.finish_reason = "stop"
+            if not seq.finish_reason and (
+                len(seq.generated) >= seq.max_tokens
+                or len(seq.prompt_ids) + len(seq.generated) >= self.config["max_context"]
+            ):
+                seq.finish_reason = "length"
+
+        # Hold back a possible partial stop string until it is ruled out
+        holdback = 0 if seq.finish_reason else max((len(s) - 1 for s in seq.stop), default=0)
+        visible = len(seq.text) - holdback
+        if visible > seq.sent:
+            seq.events.put(("delta", seq.text[seq.sent:visible]))
+            seq.sent = visible
+        if seq.finish_reason:
+            seq.events.put(("done", seq.finish_reason, len(seq.generated)))
+
+    def _drop_finished(self):
+        """Remove finished rows from the batch and trim all-padding cache columns"""
+        keep = [i for i, seq in enumerate(self.rows) if not seq.finish_reason]
+        if len(keep) == len(self.rows):
+            return
+        self.rows = [self.rows[i] for i in keep]
+        if not keep:
+            self.cache, self.mask = None, None
+            return
+
+        index = torch.tensor(keep, device=self.mask.device)
+        self.mask = self.mask.index_select(0, index)
+        lead = int((self.mask.sum(0) == 0).int().cumprod(0).sum())
+        self.mask = self.mask[:, lead:]
+        self.cache = tuple(
+            (k.index_select(0, index)[:, :, lead:], v.index_select(0, index)[:, :, lead:])
+            for k, v in self.cache
+        )
+
+
+def load_base_model(base_model: str, device: str, weight_cache_dir: Optional[str] = None):
+    """Load the frozen base for inference: fp16 on GPU, bf16 or fp32 on CPU"""
+    if device == "cuda":
+        dtype = torch.float16
+    else:
+        dtype = torch.bfloat16 if cpu_supports_bf16() else torch.float32
+
+    start = time.perf_counter()
+    if weight_cache_dir:
+        model, stats = load_cached_model(base_model, dtype, weight_cache_dir, device)
+        source = f"weight cache {stats['weight_cache']}"
+    else:
+        model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=dtype, low_cpu_mem_usage=True)
+        model.to(device)
+        source = "from_pretrained"
+    model.eval()
+    print(f"✅ Base model loaded in {time.perf_counter() - start:.1f}s ({source}): {base_model} ({dtype})")
+    return model
+
+
+def discover_adapters(adapter_args: List[str], adapters_dir: Optional[str]) -> Dict[str, str]:
+    """Map served model names to adapter directories
+
+    `--adapter name=path` registers one adapter; `--adapters-dir` registers
+    every subdirectory holding an adapter_config.json under its own name.
+    """
+    registry = {}
+    if adapters_dir:
+        for entry in sorted(os.listdir(adapters_dir)):
+            path = os.path.join(adapters_dir, entry)
+            if os.path.exists(os.path.join(path, "adapter_config.json")):
+                registry[entry] = path
+    for arg in adapter_args:
+        name, sep, path = arg.partition("=")
+        if not sep:
+            name, path = os.path.basename(os.path.normpath(arg)), arg
+        if not os.path.exists(os.path.join(path, "adapter_config.json")):
+            raise ValueError(f"No adapter_config.json in {path}")
+        registry[name] = path
+    return registry
+
+
+class APIError(Exception):
+    """Error returned to the client in OpenAI's error format"""
+
+    def __init__(self, status: int, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def make_handler(engine: BatchEngine, base_name: str, registry: Dict[str, str], api_key: Optional[str]):
+    tokenizer = engine.tokenizer
+    config = engine.config
+
+    def resolve_adapter(model: Optional[str]) -> Optional[str]:
+        if not model or model == base_name:
+            return None
+        if model in registry:
+            return model
+        raise APIError(404, f"The model '{model}' does not exist", "model_not_found")
+
+    def build_sequence(body: dict) -> Sequence:
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise APIError(400, "'messages' must be a non-empty list")
+        try:
+            with engine.tokenizer_lock:
+                prompt_ids = tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True)
+        except Exception as e:
+            raise APIError(400, f"Could not apply chat template: {e}")
+
+        room = config["max_context"] - len(prompt_ids)
+        if room <= 0:
+            raise APIError(400, f"Prompt is {len(prompt_ids)} tokens; the limit is {config['max_context']}",
+                           "context_length_exceeded")
+
+        stop = body.get("stop") or []
+        if isinstance(stop, str):
+            stop = [stop]
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or config["default_max_tokens"]
+        temperature = body.get("temperature")
+        return Sequence(
+            adapter=resolve_adapter(body.get("model")),
+            prompt_ids=prompt_ids,
+            max_tokens=max(1, min(int(max_tokens), room)),
+            temperature=float(config["default_temperature"] if temperature is None else temperature),
+            top_p=float(body.get("top_p", 1.0)),
+            stop=[s for s in stop if s],
+        )
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error(self, error: APIError):
+            self._send_json(error.status, {"error": {
+                "message": str(error),
+                "type": "invalid_request_error",
+                "code": error.code,
+            }})
+
+        def _authorized(self) -> bool:
+            if not api_key:
+                return True
+            return self.headers.get("Authorization", "") == f"Bearer {api_key}"
+
+        def _client_gone(self) -> bool:
+            """True once the peer has closed its end of the connection"""
+            try:
+                readable, _, _ = select.select([self.connection], [], [], 0)
+                return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+            except OSError:
+                return True
+
+        def _next_event(self, seq: Sequence):
+            """Next engine event, or None (and the sequence cancelled) if the client left"""
+            while True:
+                try:
+                    return seq.events.get(timeout=SERVE_CONFIG["disconnect_poll_s"])
+                except queue.Empty:
+                    if self._client_gone():
+                        seq.cancelled = True
+                        self.close_connection = True
+                        return None
+
+        def do_GET(self):
+            if self.path not in ("/health", "/v1/models"):
+                self._send_error(APIError(404, f"Unknown path {self.path}"))
+                return
+            if not self._authorized():
+                self._send_error(APIError(401, "Invalid API key", "invalid_api_key"))
+                return
+
+            if self.path == "/health":
+                self._send_json(200, {
+                    "status": "ok",
+                    "active": len(engine.rows),
+                    "waiting": len(engine.waiting) + engine.incoming.qsize(),
+                    "loaded_adapters": list(engine.adapters.loaded),
+                    "adapter_loads": engine.adapters.loads,
+                    "adapter_evictions": engine.adapters.evictions,
+                    **engine.stats,
+                })
+            elif self.path == "/v1/models":
+                now = int(time.time())
+                names = [base_name] + sorted(registry)
+                self._send_json(200, {"object": "list", "data": [
+                    {"id": name, "object": "model", "created": now, "owned_by": "heysalad"} for name in names
+                ]})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_error(APIError(404, f"Unknown path {self.path}"))
+                return
+            if not self._authorized():
+                self._send_error(APIError(401, "Invalid API key", "invalid_api_key"))
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                seq = build_sequence(body)
+            except APIError as e:
+                self._send_error(e)
+                return
+            except (ValueError, TypeError) as e:
+                self._send_error(APIError(400, f"Invalid request: {e}"))
+                return
+
+            engine.submit(seq)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = body.get("model") or base_name
+            try:
+                if body.get("stream"):
+                    self._stream(seq, completion_id, model)
+                else:
+                    self._complete(seq, completion_id, model)
+            except OSError:
+                # Any failed write means the client is gone; free its batch slot
+                seq.cancelled = True
+
+        def _complete(self, seq: Sequence, completion_id: str, model: str):
+            parts = []
+            while True:
+                event = self._next_event(seq)
+                if event is None:
+                    return
+                if event[0] == "delta":
+                    parts.append(event[1])
+                elif event[0] == "error":
+                    self._send_json(500, {"error": {"message": event[1], "type": "server_error", "code": None}})
+                    return
+                else:
+                    _, finish_reason, completion_tokens = event
+                    break
+
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(parts)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": {
+                    "prompt_tokens": len(seq.prompt_ids),
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": len(seq.prompt_ids) + completion_tokens,
+                },
+            })
+
+        def _stream(self, seq: Sequence, completion_id: str, model: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            created = int(time.time())
+
+            def send(delta: dict, finish_reason=None):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+            send({"role": "assistant"})
+            while True:
+                event = self._next_event(seq)
+                if event is None:
+                    return
+                if event[0] == "delta":
+                    send({"content": event[1]})
+                elif event[0] == "error":
+                    error = {"error": {"message": event[1], "type": "server_error", "code": None}}
+                    self.wfile.write(f"data: {json.dumps(error)}\n\n".encode())
+                    break
+                else:
+                    send({}, finish_reason=event[1])
+                    break
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a base model and HeySalad adapters over an OpenAI-compatible API"
+    )
+    parser.add_argument("--base-model", type=str, default="meta-llama/Llama-2-7b-chat-hf", help="Base model")
+    parser.add_argument("--served-name", type=str, default=None,
+                        help="Model name that selects the bare base (default: base model id)")
+    parser.add_argument("--adapter", action="append", default=[], metavar="NAME=PATH",
+                        help="Adapter to serve under NAME (repeatable)")
+    parser.add_argument("--adapters-dir", type=str, default=None,
+                        help="Serve every adapter directory found here under its directory name")
+    parser.add_argument("--device", type=str, choices=["auto", "cuda", "cpu"], default="auto", help="Device")
+    parser.add_argument("--cpu-threads", type=int, default=None, help="Intra-op threads on CPU")
+    parser.add_argument("--weight-cache-dir", type=str, default="./.weight_cache",
+                        help="Prepared mmap weight cache for the base model")
+    parser.add_argument("--no-weight-cache", action="store_true", help="Load the base with from_pretrained")
+    parser.add_argument("--api-key", type=str, default=os.getenv("HEYSALAD_SERVER_API_KEY"),
+                        help="Require this bearer token (default: $HEYSALAD_SERVER_API_KEY, or none)")
+    for key, value in SERVE_CONFIG.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value,
+                            help=f"(default: {value})")
+
+    args = parser.parse_args()
+    config = {key: getattr(args, key) for key in SERVE_CONFIG}
+
+    try:
+        registry = discover_adapters(args.adapter, args.adapters_dir)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    device = args.device
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if device == "cpu":
+        settings = configure_cpu_threads(args.cpu_threads)
+        print(f"🧵 CPU threads: {settings['intra_op_threads']}, native bf16: {settings['bf16']}")
+
+    tokenizer = load_tokenizer(args.base_model)
+    base = load_base_model(args.base_model, device, None if args.no_weight_cache else args.weight_cache_dir)
+    config["max_context"] = min(config["max_context"], getattr(base.config, "max_position_embeddings", config["max_context"]))
+
+    engine = BatchEngine(AdapterCache(base, registry, config["max_loaded_adapters"]), tokenizer, device, config)
+    engine.start()
+
+    base_name = args.served_name or args.base_model
+    server = ThreadingHTTPServer((config["host"], config["port"]), make_handler(engine, base_name, registry, args.api_key))
+    server.daemon_threads = True
+
+    print("=" * 60)
+    print("   🥗 HeySalad Inference Server")
+    print(f"   Endpoint: http://{config['host']}:{config['port']}/v1/chat/completions")
+    print(f"   Base: {base_name} ({device})")
+    print(f"   Adapters: {', '.join(sorted(registry)) or 'none'} (up to {config['max_loaded_adapters']} loaded)")
+    print(f"   Batching: up to {config['max_batch_size']} sequences")
+    print("=" * 60)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down")
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+HeySalad External Shuffle
+Shuffles JSONL datasets larger than RAM with bounded memory and a fixed seed
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+from collect_training_data import dataset_lock
+
+# Upper bound on bucket files open at once; larger inputs recurse instead
+MAX_BUCKETS = 256
+
+IO_BUFFER = 1 << 20
+
+
+def _derive_seed(seed: int, *path: int) -> int:
+    """Independent, reproducible seed for a bucket at a given recursion path"""
+    digest = hashlib.sha256(repr((seed,) + path).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def _shuffle_in_memory(src: str, out, seed: int) -> int:
+    with open(src, "rb") as f:
+        lines = f.readlines()
+    if lines and not lines[-1].endswith(b"\n"):
+        lines[-1] += b"\n"
+    random.Random(seed).shuffle(lines)
+    out.writelines(lines)
+    return len(lines)
+
+
+def _shuffle_file(src: str, out, memory_bytes: int, seed: int, tmp_dir: str, path=()) -> int:
+    """Shuffle src into the open output file; returns the number of lines written"""
+    size = os.path.getsize(src)
+    # Python line lists cost roughly 2x the raw bytes, so keep in-memory runs under half the budget
+    if size <= memory_bytes // 2:
+        return _shuffle_in_memory(src, out, _derive_seed(seed, *path))
+
+    # Scatter every line into a uniformly random bucket so each fits in memory
+    buckets = min(MAX_BUCKETS, -(-size * 2 // memory_bytes) * 2)
+    rng = random.Random(_derive_seed(seed, *path, -1))
+    run_dir = tempfile.mkdtemp(prefix="run-", dir=tmp_dir)
+    run_paths = [os.path.join(run_dir, f"{i:04d}.jsonl") for i in range(buckets)]
+    buffer_size = max(64 * 1024, min(IO_BUFFER, memory_bytes // (4 * buckets)))
+
+    try:
+        runs = [open(p, "wb", buffering=buffer_size) for p in run_paths]
+        try:
+            pick = rng.randrange
+            with open(src, "rb", buffering=IO_BUFFER) as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        line += b"\n"
+                    runs[pick(buckets)].write(line)
+        finally:
+            for run in runs:
+                run.close()
+
+        # Gather: shuffle each run (recursing if it is still too large) and concatenate
+        written = 0
+        for i, run_path in enumerate(run_paths):
+            if os.path.getsize(run_path) == size:
+                # Degenerate split (e.g. one giant line); nothing more to gain by recursing
+                written += _shuffle_in_memory(run_path, out, _derive_seed(seed, *path, i))
+            else:
+                written += _shuffle_file(run_path, out, memory_bytes, seed, tmp_dir, path + (i,))
+            os.remove(run_path)
+        return written
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def shuffle_jsonl(
+    input_path: str,
+    output_path: str = None,
+    seed: int = 42,
+    memory_mb: int = 1024,
+    tmp_dir: str = None,
+) -> int:
+    """Uniformly shuffle the lines of a JSONL file using at most ~memory_mb of RAM
+
+    Lines are scattered into random temporary runs in one sequential pass,
+    then each run is shuffled in memory (or recursively scattered again if it
+    is still too big) and the runs are concatenated into the output. The
+    result depends only on the input, seed and memory budget. output_path
+    may equal input_path; the output is replaced atomically while holding
+    its dataset lock, so concurrent appends wait instead of being lost.
+    """
+    output_path = output_path or input_path
+    memory_bytes = memory_mb * 1024 * 1024
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(out_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".shuffle-", dir=tmp_dir or out_dir)
+
+    start = time.perf_counter()
+    try:
+        tmp_output = os.path.join(work_dir, "shuffled.jsonl")
+        with dataset_lock(output_path):
+            with open(tmp_output, "wb", buffering=IO_BUFFER) as out:
+                lines = _shuffle_file(input_path, out, memory_bytes, seed, work_dir)
+            os.replace(tmp_output, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(output_path) / 1e6
+    rate = size_mb / elapsed if elapsed else 0.0
+    print(f"✅ Shuffled {lines:,} examples ({size_mb:,.1f} MB) in {elapsed:.1f}s ({rate:,.0f} MB/s)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Shuffle a JSONL dataset that may be larger than RAM"
+    )
+    parser.add_argument("--input", type=str, default="./data/training_data.jsonl", help="Input JSONL")
+    parser.add_argument("--output", type=str, default=None, help="Output JSONL (default: shuffle in place)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="Memory budget in MB")
+    parser.add_argument("--tmp-dir", type=str, default=None, help="Where to spill runs (default: next to output)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Dataset not found at: {args.input}")
+        sys.exit(1)
+
+    shuffle_jsonl(args.input, args.output, args.seed, args.memory_mb, args.tmp_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Training scripts are flat modules in model-training/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
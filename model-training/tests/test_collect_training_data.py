@@ -0,0 +1,101 @@
+"""Cross-process locking of the training data file"""
+
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from collect_training_data import TrainingDataCollector, append_records, dataset_lock
+
+RECORD = {"messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]}
+
+
+def _append(path, started):
+    started.set()
+    append_records(path, [RECORD])
+
+
+def test_append_waits_for_sidecar_lock(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    started = multiprocessing.Event()
+
+    with dataset_lock(path):
+        proc = multiprocessing.Process(target=_append, args=(path, started))
+        proc.start()
+        assert started.wait(10)
+        proc.join(0.5)
+        # The appender is blocked while the lock is held, so nothing reached the file
+        assert proc.is_alive()
+        assert not os.path.exists(path) or os.path.getsize(path) == 0
+    proc.join(10)
+
+    assert proc.exitcode == 0
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [RECORD]
+
+
+def test_load_existing_sees_records_appended_after_save(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    collector = TrainingDataCollector(output_path=path)
+    collector.data = [RECORD]
+    collector.save()
+
+    # The replacement is visible through the same path the lock protects
+    append_records(path, [RECORD])
+    collector.load_existing()
+    assert collector.data == [RECORD, RECORD]
+    assert os.path.exists(f"{path}.lock")
+
+
+def test_save_refuses_to_drop_rows_appended_by_another_writer(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    collector = TrainingDataCollector(output_path=path)
+    collector.data = [RECORD]
+    collector.save()
+
+    append_records(path, [{"messages": RECORD["messages"], "id": "external"}])
+    collector.add_conversation(RECORD["messages"])
+    with pytest.raises(RuntimeError):
+        collector.save()
+
+    # append() is still safe, and save() works again after reloading
+    collector.append()
+    with open(path) as f:
+        assert len(f.readlines()) == 3
+    collector.load_existing()
+    collector.save()
+
+
+def test_own_appends_keep_save_allowed(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    collector = TrainingDataCollector(output_path=path)
+    collector.data = [RECORD]
+    collector.save()
+    collector.add_conversation(RECORD["messages"])
+    collector.append()
+
+    collector.save()
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_shuffle_holds_lock_until_replace(tmp_path):
+    path = str(tmp_path / "data.jsonl")
+    collector = TrainingDataCollector(output_path=path)
+    collector.data = [{"messages": RECORD["messages"], "id": i} for i in range(50)]
+    collector.save()
+    started = multiprocessing.Event()
+
+    with dataset_lock(path):
+        proc = multiprocessing.Process(target=_append, args=(path, started))
+        proc.start()
+        assert started.wait(10)
+        proc.join(0.5)
+        assert proc.is_alive()
+    # Once released, the shuffle and the append serialize and neither loses lines
+    collector.shuffle(seed=1)
+    proc.join(10)
+
+    with open(path) as f:
+        assert len(f.readlines()) == 51
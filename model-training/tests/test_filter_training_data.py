@@ -0,0 +1,105 @@
+"""Quality filter checks, malformed rows and audit bookkeeping"""
+
+import json
+
+import numpy as np
+import pytest
+
+from filter_training_data import FILTER_CONFIG, batch_features, drop_reasons, filter_dataset
+
+
+def conversation(user, assistant=None):
+    messages = [{"role": "user", "content": user}]
+    if assistant is not None:
+        messages.append({"role": "assistant", "content": assistant})
+    return json.dumps({"messages": messages})
+
+
+GOOD = [
+    conversation(
+        "How do I automate invoice reminders with the API?",
+        "Create a workflow that runs daily, query unpaid invoices older than seven days, "
+        "then send each customer a reminder email with a payment link and log the result.",
+    ),
+    conversation(
+        "Can you summarise yesterday's orders?",
+        "Yesterday there were forty orders, mostly salads for lunch delivery, with two refunds "
+        "caused by late couriers and one missing dressing reported by a customer downtown.",
+    ),
+]
+
+CASES = {
+    "no_assistant": conversation("Tell me about workflow automation please"),
+    "empty_assistant_turn": conversation("Tell me about workflow automation please", "ok"),
+    "too_short": conversation("hi", "Hello there"),
+    "too_long": conversation("Write a long list", " ".join(f"word{i}" for i in range(6000))),
+    "repetitive": conversation("Say something", "the cat sat " * 20),
+    "low_entropy": conversation("Say something", "the cat sat " * 20),
+    "role_imbalance": conversation(
+        "x" * 5000,
+        "Sure, here is a short answer for you",
+    ),
+    "mostly_code_fences": conversation(
+        "Show me the script",
+        "```\n" + "\n".join(f"x{i} = {i}" for i in range(100)) + "\n```\nok",
+    ),
+}
+
+INVALID = [
+    json.dumps({"messages": ["oops"]}),
+    json.dumps({"messages": [{"role": "user", "content": [{"type": "text", "text": "hi"}]}]}),
+    json.dumps({"messages": [{"role": "user", "content": 5}]}),
+    json.dumps({"messages": [{"role": "user"}]}),
+    json.dumps({"messages": "hello"}),
+    json.dumps({"prompt": "no messages"}),
+    json.dumps([1, 2, 3]),
+    "not json at all",
+]
+
+
+def reasons_for(lines):
+    features = batch_features(([line.encode() for line in lines], FILTER_CONFIG["min_assistant_chars"]))
+    masks = drop_reasons(features, FILTER_CONFIG)
+    return [[reason for reason, mask in masks.items() if mask[i]] for i in range(len(lines))]
+
+
+@pytest.mark.parametrize("reason", sorted(CASES))
+def test_each_reason_fires(reason):
+    assert reason in reasons_for([CASES[reason]])[0]
+
+
+def test_good_rows_have_no_reasons():
+    assert reasons_for(GOOD) == [[], []]
+
+
+def test_malformed_rows_are_only_invalid():
+    features = batch_features(([line.encode() for line in INVALID], FILTER_CONFIG["min_assistant_chars"]))
+    assert np.isnan(features).all()
+    assert reasons_for(INVALID) == [["invalid"]] * len(INVALID)
+
+
+def test_filter_dataset_preserves_order_and_audits_row_numbers(tmp_path):
+    bad = list(CASES.values()) + INVALID
+    lines, expected_kept, expected_dropped = [], [], []
+    for i, line in enumerate(bad):
+        # Interleave good rows so kept order and row numbers are both checked across batches
+        good = GOOD[i % 2]
+        expected_kept.append(len(lines))
+        lines.append(good)
+        expected_dropped.append(len(lines))
+        lines.append(line)
+
+    source = tmp_path / "data.jsonl"
+    source.write_text("".join(line + "\n" for line in lines))
+    output = tmp_path / "out" / "filtered.jsonl"
+    audit = tmp_path / "out" / "audit.jsonl"
+
+    summary = filter_dataset(str(source), str(output), str(audit), batch_rows=3, workers=2)
+
+    assert output.read_text().splitlines() == [lines[i] for i in expected_kept]
+    entries = [json.loads(line) for line in audit.read_text().splitlines()]
+    assert [entry["row"] for entry in entries] == expected_dropped
+    assert summary["rows"] == len(lines)
+    assert summary["kept"] == len(expected_kept)
+    assert summary["reasons"]["invalid"] == len(INVALID)
+    assert all(entry["features"]["total_chars"] is None for entry in entries if entry["reasons"] == ["invalid"])
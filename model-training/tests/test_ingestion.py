@@ -0,0 +1,80 @@
+"""Ingestion service failure handling"""
+
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from ingestion import IngestionError, IngestionService, ingest_files
+
+SCRIPT = Path(__file__).resolve().parent.parent / "ingestion.py"
+MESSAGES = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+
+def run_with_deadline(target, seconds=20):
+    """Run target in a daemon thread so a hang fails the test instead of the suite"""
+    outcome = {}
+
+    def wrapper():
+        try:
+            outcome["result"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=wrapper, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "ingestion hung"
+    return outcome
+
+
+def test_unwritable_output_fails_instead_of_hanging(tmp_path):
+    source = tmp_path / "src.jsonl"
+    source.write_text("".join(json.dumps({"messages": MESSAGES}) + "\n" for _ in range(200)))
+    output = tmp_path / "out"
+    output.mkdir()
+
+    # A subprocess, because producer threads blocked on a dead writer would keep pytest alive
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT), str(source), "--output", str(output), "--max-queue", "10", "--batch-size", "5"],
+        capture_output=True, text=True, timeout=30,
+    )
+
+    assert result.returncode == 1
+    assert "writer failed" in result.stdout
+
+
+def test_submit_raises_after_writer_failure(tmp_path):
+    output = tmp_path / "out"
+    output.mkdir()
+
+    async def run():
+        service = IngestionService(str(output), max_queue=2, batch_size=1, flush_interval=0.01)
+        await service.start()
+        with pytest.raises(IngestionError):
+            for _ in range(100):
+                await service.submit(MESSAGES)
+        with pytest.raises(IngestionError):
+            await service.close()
+
+    outcome = run_with_deadline(lambda: asyncio.run(run()))
+    assert "error" not in outcome, outcome.get("error")
+
+
+def test_ingest_files_appends_every_row(tmp_path):
+    sources = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.jsonl"
+        path.write_text("".join(json.dumps({"messages": MESSAGES, "src": name}) + "\n" for _ in range(30)))
+        sources.append(str(path))
+    output = tmp_path / "data" / "train.jsonl"
+
+    stats = ingest_files(sources, str(output), max_queue=8, batch_size=4)
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert stats["written"] == len(rows) == 60
+    assert sorted(row["src"] for row in rows) == ["a"] * 30 + ["b"] * 30
@@ -0,0 +1,18 @@
+"""Stage inputs follow local imports"""
+
+from pipeline import HERE, local_sources
+
+
+def test_local_sources_follow_nested_and_transitive_imports(tmp_path):
+    (tmp_path / "main.py").write_text("import os\n\ndef run():\n    import helper\n")
+    (tmp_path / "helper.py").write_text("from inner import thing\nimport json\n")
+    (tmp_path / "inner.py").write_text("import main\nthing = 1\n")
+    (tmp_path / "unused.py").write_text("")
+
+    assert [p.name for p in local_sources(tmp_path / "main.py")] == ["helper.py", "inner.py", "main.py"]
+
+
+def test_train_stage_hashes_the_modules_training_depends_on():
+    names = {p.name for p in local_sources(HERE / "train_heysalad.py")}
+    assert {"train_heysalad.py", "tokenization.py", "cpu_backend.py", "weight_cache.py",
+            "training_manifest.py"} <= names
@@ -0,0 +1,32 @@
+"""Safetensors header validation on hand-built files"""
+
+import json
+import struct
+
+import pytest
+
+from preflight import PreflightError, read_safetensors_header
+
+
+def write_safetensors(path, header, data=b""):
+    raw = json.dumps(header).encode()
+    path.write_bytes(struct.pack("<Q", len(raw)) + raw + data)
+    return path
+
+
+def test_valid_header_round_trips(tmp_path):
+    header = {"w": {"dtype": "F16", "shape": [2, 2], "data_offsets": [0, 8]}}
+    path = write_safetensors(tmp_path / "ok.safetensors", header, b"\0" * 8)
+    assert read_safetensors_header(path) == header
+
+
+@pytest.mark.parametrize("entry", [
+    "bad",
+    ["F16", [2], [0, 4]],
+    {"dtype": "F16", "shape": [2], "data_offsets": ["0", "4"]},
+    {"dtype": "F16", "shape": [2], "data_offsets": [-4, 0]},
+])
+def test_corrupt_entry_raises_preflight_error(tmp_path, entry):
+    path = write_safetensors(tmp_path / "bad.safetensors", {"x": entry}, b"\0" * 4)
+    with pytest.raises(PreflightError):
+        read_safetensors_header(path)
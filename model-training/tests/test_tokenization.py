@@ -0,0 +1,172 @@
+"""Turn-boundary windowing on token-level fake chat templates"""
+
+from tokenization import (
+    IGNORE_INDEX,
+    conversation_windows,
+    folded_system_opener,
+    message_spans,
+    split_turns,
+    tokenize_examples,
+)
+
+BOS, EOS = 1, 2
+INST, END_INST, SYS, END_SYS = 30, 31, 40, 41
+IM_START, IM_END = 50, 51
+ROLE_IDS = {"system": 60, "user": 61, "assistant": 62}
+
+
+def words(text):
+    """Each word is the integer token it spells, so expected ids are easy to read"""
+    return [int(word) for word in text.split()]
+
+
+class Llama2Tokenizer:
+    """Llama 2 chat layout: system folded into the first [INST], every user turn opens with BOS"""
+
+    bos_token_id = BOS
+
+    def apply_chat_template(self, messages, tokenize=True, add_generation_prompt=False):
+        system = []
+        if messages and messages[0]["role"] == "system":
+            system = [SYS] + words(messages[0]["content"]) + [END_SYS]
+            messages = messages[1:]
+        ids = []
+        for i, message in enumerate(messages):
+            if message["role"] == "user":
+                ids += [BOS, INST] + (system if i == 0 else []) + words(message["content"]) + [END_INST]
+            else:
+                ids += words(message["content"]) + [EOS]
+        return ids
+
+
+class ChatMLTokenizer:
+    """ChatML layout: every message, including system, is its own block; no BOS"""
+
+    bos_token_id = None
+
+    def apply_chat_template(self, messages, tokenize=True, add_generation_prompt=False):
+        ids = []
+        for message in messages:
+            ids += [IM_START, ROLE_IDS[message["role"]]] + words(message["content"]) + [IM_END]
+        return ids
+
+
+CONVERSATION = [
+    {"role": "system", "content": "700 701 702"},
+    {"role": "user", "content": "100 101 102 103"},
+    {"role": "assistant", "content": "200 201 202 203"},
+    {"role": "user", "content": "110 111 112 113"},
+    {"role": "assistant", "content": "210 211 212 213"},
+    {"role": "user", "content": "120 121 122 123"},
+    {"role": "assistant", "content": "220 221 222 223"},
+]
+
+
+def windows_for(messages, tokenizer, max_length):
+    ids, spans = message_spans(messages, tokenizer)
+    opener = folded_system_opener(messages, spans, tokenizer)
+    return conversation_windows(ids, spans, max_length, tokenizer.bos_token_id, opener)
+
+
+def supervised(labels):
+    return [label for label in labels if label != IGNORE_INDEX]
+
+
+def test_split_turns_groups_prompts_and_drops_trailing_user():
+    spans = [(0, 0, "system"), (0, 5, "user"), (5, 9, "assistant"), (9, 12, "user"), (12, 20, "user"),
+             (20, 25, "assistant"), (25, 30, "user")]
+    assert split_turns(spans) == [(0, 5, 9), (9, 20, 25)]
+
+
+def test_folded_system_repeats_system_in_every_window():
+    tokenizer = Llama2Tokenizer()
+    windows = windows_for(CONVERSATION, tokenizer, max_length=24)
+
+    assert len(windows) == 3
+    for input_ids, labels in windows:
+        assert input_ids[:3] == [BOS, INST, SYS]
+        assert input_ids.count(BOS) == 1
+        assert words("700 701 702") == input_ids[3:6]
+        assert len(input_ids) == len(labels) <= 24
+
+    assert [supervised(labels) for _, labels in windows] == [
+        words("200 201 202 203") + [EOS],
+        words("210 211 212 213") + [EOS],
+        words("220 221 222 223") + [EOS],
+    ]
+    # Second window is exactly what the template renders for [system, user, assistant]
+    assert windows[1][0] == tokenizer.apply_chat_template(
+        [CONVERSATION[0], CONVERSATION[3], CONVERSATION[4]]
+    )
+
+
+def test_folded_template_without_opener_has_single_bos():
+    tokenizer = Llama2Tokenizer()
+    ids, spans = message_spans(CONVERSATION, tokenizer)
+    windows = conversation_windows(ids, spans, 24, BOS)
+
+    # Without the system prompt the last two turns share a window; its second turn keeps its own BOS
+    assert len(windows) == 2
+    assert windows[0][0].count(BOS) == 1
+    assert windows[1][0][:3] == [BOS, INST, 110]
+    assert windows[1][0].count(BOS) == 2
+
+
+def test_first_window_matches_full_render_when_it_fits():
+    tokenizer = Llama2Tokenizer()
+    ids, _ = message_spans(CONVERSATION, tokenizer)
+    windows = windows_for(CONVERSATION, tokenizer, max_length=512)
+
+    assert len(windows) == 1
+    assert windows[0][0] == ids
+
+
+def test_unfolded_system_span_is_repeated_as_head():
+    tokenizer = ChatMLTokenizer()
+    windows = windows_for(CONVERSATION, tokenizer, max_length=20)
+    head = [IM_START, ROLE_IDS["system"]] + words("700 701 702") + [IM_END]
+
+    assert len(windows) == 3
+    for input_ids, labels in windows:
+        assert input_ids[:len(head)] == head
+        assert labels[:len(head)] == [IGNORE_INDEX] * len(head)
+        assert input_ids.count(IM_START) == 3
+
+
+def test_oversize_single_turn_is_cut_to_budget():
+    tokenizer = Llama2Tokenizer()
+    reply = " ".join(str(300 + i) for i in range(40))
+    messages = [
+        {"role": "user", "content": "100 101 102 103 104 105"},
+        {"role": "assistant", "content": reply},
+    ]
+    windows = windows_for(messages, tokenizer, max_length=16)
+
+    assert len(windows) == 1
+    input_ids, labels = windows[0]
+    assert len(input_ids) == len(labels) == 16
+    assert input_ids[0] == BOS
+    # Prompt keeps its tail, reply keeps its head
+    assert input_ids[-len(supervised(labels)):] == words(reply)[:len(supervised(labels))]
+    assert supervised(labels)
+
+
+def test_trailing_user_turn_is_not_trained():
+    tokenizer = Llama2Tokenizer()
+    messages = CONVERSATION[:5] + [{"role": "user", "content": "130 131"}]
+    windows = windows_for(messages, tokenizer, max_length=512)
+
+    assert len(windows) == 1
+    input_ids, labels = windows[0]
+    assert 130 not in input_ids
+    assert supervised(labels)[-1] == EOS
+
+
+def test_tokenize_examples_reports_source_stats_once():
+    tokenizer = Llama2Tokenizer()
+    out = tokenize_examples({"messages": [CONVERSATION]}, tokenizer, max_length=24)
+
+    assert len(out["input_ids"]) == 3
+    assert out["attention_mask"] == [[1] * len(ids) for ids in out["input_ids"]]
+    assert out["source_supervised"] == [15, 0, 0]
+    assert [tokens > 0 for tokens in out["source_tokens"]] == [True, False, False]
@@ -0,0 +1,136 @@
+"""Append-only checks, replay sampling and lineage for continued training"""
+
+import json
+
+import pytest
+
+import training_manifest
+from training_manifest import dataset_fingerprint, select_continuation_rows, write_manifest
+
+
+def row(i):
+    return {"messages": [{"role": "user", "content": f"q{i}"}, {"role": "assistant", "content": f"a{i}"}]}
+
+
+def write_rows(path, rows, mode="w"):
+    with open(path, mode) as f:
+        for item in rows:
+            f.write(json.dumps(item) + "\n")
+
+
+def parent_for(path, rows):
+    return {"dataset": dataset_fingerprint(str(path), rows)}
+
+
+def test_clean_append_selects_only_new_rows(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(i) for i in range(10)])
+    parent = parent_for(path, 10)
+    write_rows(path, [row(i) for i in range(10, 14)], mode="a")
+
+    selection = select_continuation_rows(str(path), parent)
+
+    assert selection["new_rows"] == [row(i) for i in range(10, 14)]
+    assert selection["replay_rows"] == []
+    assert selection["dataset"] == dataset_fingerprint(str(path))
+
+
+def test_blank_lines_do_not_count_as_rows(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(0), row(1)])
+    parent = parent_for(path, 2)
+    with open(path, "a") as f:
+        f.write("\n" + json.dumps(row(2)) + "\n\n")
+
+    assert select_continuation_rows(str(path), parent)["new_rows"] == [row(2)]
+
+
+@pytest.mark.parametrize("rewrite", [
+    lambda rows: [row(99)] + rows[1:],          # edited
+    lambda rows: rows[1:] + rows[:1],           # reordered, e.g. shuffled in place
+    lambda rows: rows[:5],                      # shorter
+])
+def test_rewritten_prefix_is_rejected(tmp_path, rewrite):
+    path = tmp_path / "data.jsonl"
+    rows = [row(i) for i in range(10)]
+    write_rows(path, rows)
+    parent = parent_for(path, 10)
+    write_rows(path, rewrite(rows) + [row(10)])
+
+    with pytest.raises(ValueError, match="append-only"):
+        select_continuation_rows(str(path), parent)
+
+
+def test_replay_sample_is_bounded_and_reproducible(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(i) for i in range(10)])
+    parent = parent_for(path, 10)
+    write_rows(path, [row(i) for i in range(10, 14)], mode="a")
+
+    half = select_continuation_rows(str(path), parent, replay_ratio=0.5, seed=1)
+    assert len(half["replay_rows"]) == 2
+    assert all(item in [row(i) for i in range(10)] for item in half["replay_rows"])
+    assert half == select_continuation_rows(str(path), parent, replay_ratio=0.5, seed=1)
+
+    # Capped at the rows the parent saw
+    assert len(select_continuation_rows(str(path), parent, replay_ratio=100)["replay_rows"]) == 10
+    assert select_continuation_rows(str(path), parent, replay_ratio=0)["replay_rows"] == []
+
+
+def test_negative_replay_ratio_is_rejected(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(i) for i in range(4)])
+    parent = parent_for(path, 2)
+
+    with pytest.raises(ValueError, match="replay_ratio"):
+        select_continuation_rows(str(path), parent, replay_ratio=-0.5)
+
+
+def test_rows_appended_during_selection_are_left_for_next_run(tmp_path, monkeypatch):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(i) for i in range(5)])
+    parent = parent_for(path, 3)
+    original_rows = training_manifest._rows
+    passes = []
+
+    def rows_then_append(p):
+        yield from original_rows(p)
+        passes.append(p)
+        if len(passes) == 1:
+            # The prefix check stops early, so the first full pass is the count:
+            # append after it, before the selection pass
+            write_rows(path, [row(5), row(6)], mode="a")
+
+    monkeypatch.setattr(training_manifest, "_rows", rows_then_append)
+    selection = select_continuation_rows(str(path), parent)
+
+    assert selection["new_rows"] == [row(3), row(4)]
+    assert selection["dataset"] == dataset_fingerprint(str(path), 5)
+    assert dataset_fingerprint(str(path))["rows"] == 7
+
+    # The next continuation picks up exactly the late rows
+    monkeypatch.setattr(training_manifest, "_rows", original_rows)
+    follow_up = select_continuation_rows(str(path), {"dataset": selection["dataset"]})
+    assert follow_up["new_rows"] == [row(5), row(6)]
+
+
+def test_lineage_extends_parent(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_rows(path, [row(i) for i in range(3)])
+    fingerprint = dataset_fingerprint(str(path))
+
+    first = write_manifest(str(tmp_path / "a"), str(path), fingerprint, "base", "v1", trained_rows=3)
+    second = write_manifest(
+        str(tmp_path / "b"), str(path), fingerprint, "base", "v2", trained_rows=1,
+        parent_dir=str(tmp_path / "a"), parent=first, replay_rows=1,
+    )
+    third = write_manifest(
+        str(tmp_path / "c"), str(path), fingerprint, "base", "v3", trained_rows=1,
+        parent_dir=str(tmp_path / "b"), parent=second,
+    )
+
+    assert first["mode"] == "full" and first["lineage"] == []
+    assert second["mode"] == "continue"
+    assert [entry["version"] for entry in third["lineage"]] == ["v1", "v2"]
+    assert third["lineage"][-1]["adapter"] == str(tmp_path / "b")
+    assert json.loads((tmp_path / "c" / "training_manifest.json").read_text()) == third
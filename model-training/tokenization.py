@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+HeySalad Tokenization
+Shared chat-template tokenization plus an incremental, chunk-cached tokenizer
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from itertools import islice
+from typing import List
+
+# transformers / datasets are imported where used so the windowing logic can be
+# exercised (and unit tested) without them
+
+# Rows per cached chunk; appending data only re-tokenizes the last partial chunk
+CHUNK_ROWS = 10000
+
+
+def load_tokenizer(base_model: str):
+    """Load the base tokenizer configured the way training expects"""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model)
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "right"
+    return tokenizer
+
+
+IGNORE_INDEX = -100
+
+# Per-window bookkeeping columns used by supervision_report, stripped before training
+STATS_COLUMNS = ["source_tokens", "source_supervised", "legacy_supervised"]
+
+
+def message_spans(messages, tokenizer):
+    """Token ids of a rendered conversation plus the (start, end, role) span of each message
+
+    Spans come from rendering successively longer prefixes of the
+    conversation, so each message owns exactly the template tokens it adds.
+    """
+    spans = []
+    previous = 0
+    ids = []
+    for k in range(1, len(messages) + 1):
+        ids = tokenizer.apply_chat_template(messages[:k], tokenize=True, add_generation_prompt=False)
+        spans.append((previous, len(ids), messages[k - 1]["role"]))
+        previous = len(ids)
+    return ids, spans
+
+
+def split_turns(spans):
+    """Group spans into turns: any prompt spans followed by one assistant span
+
+    Trailing prompt spans with no assistant reply are dropped since they carry no loss.
+    """
+    turns = []
+    prompt_start = None
+    for start, end, role in spans:
+        if prompt_start is None:
+            prompt_start = start
+        if role == "assistant":
+            turns.append((prompt_start, start, end))
+            prompt_start = None
+    return turns
+
+
+def conversation_windows(ids, spans, max_length: int, bos_token_id=None, opener=None):
+    """Split one conversation at turn boundaries into windows of at most max_length
+
+    Every window ends on an assistant reply, and a leading system message is
+    repeated at the start of each window when it fits in half the budget.
+    Templates that fold the system prompt into the first user turn (Llama 2)
+    give it an empty span; for those, `opener(turn)` returns the token ids of
+    that turn's prompt re-rendered with the system message (or None), and is
+    used in place of the plain prompt when the turn opens a new window.
+    Returns (input_ids, labels) pairs with prompt tokens masked out.
+    """
+    head = []
+    if spans and spans[0][2] == "system" and 0 < spans[0][1] - spans[0][0] <= max_length // 2:
+        head = ids[spans[0][0]:spans[0][1]]
+    elif bos_token_id is not None and ids and ids[0] == bos_token_id:
+        head = ids[:1]
+
+    windows = []
+    current_ids, current_labels = [], []
+
+    def flush():
+        if any(label != IGNORE_INDEX for label in current_labels):
+            windows.append((current_ids, current_labels))
+
+    for turn, (prompt_start, reply_start, reply_end) in enumerate(split_turns(spans)):
+        prompt = ids[prompt_start:reply_start]
+        reply = ids[reply_start:reply_end]
+
+        # The first turn already begins with the head tokens
+        if prompt_start == 0:
+            prompt = prompt[len(head):]
+
+        if current_ids and len(current_ids) + len(prompt) + len(reply) > max_length:
+            flush()
+            current_ids, current_labels = [], []
+
+        if not current_ids:
+            rendered = opener(turn) if opener and turn > 0 else None
+            if rendered and len(rendered) - len(prompt) <= max_length // 2:
+                # Re-rendered prompt already carries BOS and the system message
+                start_ids, prompt = [], list(rendered)
+            else:
+                start_ids = list(head)
+                # Templates that start every turn with BOS (Llama 2) would repeat it after the head
+                if bos_token_id is not None and head[:1] == [bos_token_id] and prompt[:1] == [bos_token_id]:
+                    prompt = prompt[1:]
+            current_ids = start_ids
+            current_labels = [IGNORE_INDEX] * len(start_ids)
+
+        room = max_length - len(current_ids)
+        if len(prompt) + len(reply) > room:
+            # Keep the end of the prompt and as much of the reply as fits
+            keep_prompt = max(room - len(reply), min(len(prompt), room // 4))
+            prompt = prompt[len(prompt) - keep_prompt:] if keep_prompt else []
+            reply = reply[:room - len(prompt)]
+
+        current_ids = current_ids + prompt + reply
+        current_labels = current_labels + [IGNORE_INDEX] * len(prompt) + list(reply)
+
+    if current_ids:
+        flush()
+
+    return windows
+
+
+def folded_system_opener(messages, spans, tokenizer):
+    """opener() for conversation_windows when the template folds the system prompt in
+
+    Returns None for templates that render the system message on its own.
+    """
+    if not (messages and messages[0]["role"] == "system" and spans and spans[0][0] == spans[0][1]):
+        return None
+
+    # Message indices of each turn's prompt, matching split_turns
+    turn_prompts = []
+    first = None
+    for k, (_, _, role) in enumerate(spans):
+        if first is None:
+            first = k
+        if role == "assistant":
+            turn_prompts.append((first, k))
+            first = None
+
+    def opener(turn):
+        first, reply = turn_prompts[turn]
+        if first == reply:
+            return None
+        try:
+            return tokenizer.apply_chat_template(
+                [messages[0]] + messages[first:reply], tokenize=True, add_generation_prompt=False
+            )
+        except Exception:
+            # Strict templates may reject the shortened conversation; fall back to the plain prompt
+            return None
+
+    return opener
+
+
+def tokenize_examples(examples, tokenizer, max_length: int):
+    """Tokenize a batch of conversations into supervised windows
+
+    Conversations longer than max_length are split at turn boundaries rather
+    than cut from the end, labels cover assistant tokens only, and rows are
+    left unpadded for dynamic padding in the collator.
+    """
+    tokenized = {"input_ids": [], "attention_mask": [], "labels": []}
+    for column in STATS_COLUMNS:
+        tokenized[column] = []
+
+    for messages in examples['messages']:
+        ids, spans = message_spans(messages, tokenizer)
+        supervised = sum(end - start for start, end, role in spans if role == "assistant")
+        # What the old truncate-from-the-end tokenization kept under loss
+        legacy = sum(
+            max(0, min(end, max_length) - start)
+            for start, end, role in spans if role == "assistant" and start < max_length
+        )
+
+        opener = folded_system_opener(messages, spans, tokenizer)
+        windows = conversation_windows(ids, spans, max_length, tokenizer.bos_token_id, opener)
+        for i, (input_ids, labels) in enumerate(windows):
+            tokenized["input_ids"].append(input_ids)
+            tokenized["attention_mask"].append([1] * len(input_ids))
+            tokenized["labels"].append(labels)
+            tokenized["source_tokens"].append(len(ids) if i == 0 else 0)
+            tokenized["source_supervised"].append(supervised if i == 0 else 0)
+            tokenized["legacy_supervised"].append(legacy if i == 0 else 0)
+
+    return tokenized
+
+
+def supervision_report(dataset, max_length: int, batch_size: int) -> dict:
+    """Compare loss-carrying tokens per step before and after windowing
+
+    "Before" is the legacy scheme: every conversation padded or cut to
+    max_length. "After" counts the split windows without padding (dynamic
+    padding adds a little on top, depending on batch composition).
+    """
+    conversations = sum(1 for tokens in dataset["source_tokens"] if tokens)
+    windows = len(dataset)
+    lengths = [len(ids) for ids in dataset["input_ids"]]
+    supervised_after = sum(sum(1 for label in labels if label != IGNORE_INDEX) for labels in dataset["labels"])
+    supervised_total = sum(dataset["source_supervised"])
+    supervised_before = sum(dataset["legacy_supervised"])
+
+    compute_before = conversations * max_length
+    compute_after = sum(lengths)
+
+    report = {
+        "conversations": conversations,
+        "windows": windows,
+        "assistant_tokens": supervised_total,
+        "before": {
+            "compute_tokens": compute_before,
+            "supervised_tokens": supervised_before,
+            "supervised_per_step": supervised_before / conversations * batch_size if conversations else 0.0,
+            "compute_per_step": max_length * batch_size,
+        },
+        "after": {
+            "compute_tokens": compute_after,
+            "supervised_tokens": supervised_after,
+            "supervised_per_step": supervised_after / windows * batch_size if windows else 0.0,
+            "compute_per_step": compute_after / windows * batch_size if windows else 0.0,
+        },
+    }
+
+    print(f"📐 Supervision ({conversations} conversations → {windows} windows, batch {batch_size}):")
+    for name in ("before", "after"):
+        stats = report[name]
+        share = stats["supervised_tokens"] / stats["compute_tokens"] if stats["compute_tokens"] else 0.0
+        print(
+            f"   {name:<6} {stats['supervised_per_step']:>8.0f} assistant loss tokens / {stats['compute_per_step']:>8.0f} "
+            f"compute tokens per step ({share:.1%}), "
+            f"{stats['supervised_tokens']:,}/{supervised_total:,} assistant tokens trained"
+        )
+
+    return report
+
+
+def tokenize_dataset(dataset, tokenizer, max_length: int, desc: str = "Tokenizing"):
+    """Tokenize a Dataset or DatasetDict of conversations"""
+    from datasets import DatasetDict
+
+    columns = dataset["train"].column_names if isinstance(dataset, DatasetDict) else dataset.column_names
+    return dataset.map(
+        lambda examples: tokenize_examples(examples, tokenizer, max_length),
+        batched=True,
+        remove_columns=columns,
+        desc=desc
+    )
+
+
+def tokenize_incremental(
+    dataset_path: str,
+    manifest_path: str,
+    base_model: str,
+    max_length: int,
+    cache_dir: str = "./.pipeline/tokenized",
+    chunk_rows: int = CHUNK_ROWS,
+) -> dict:
+    """Tokenize a JSONL dataset in content-addressed chunks
+
+    Each chunk of `chunk_rows` lines is keyed by the hash of its bytes plus
+    the tokenizer settings, so unchanged chunks are reused from `cache_dir`
+    and an append only tokenizes the rows after the last full chunk. The
+    ordered list of chunk directories is written to `manifest_path`.
+    """
+    from datasets import Dataset
+
+    # Chunk keys include this module's source so tokenization changes invalidate the cache
+    with open(__file__, "rb") as f:
+        code_hash = hashlib.sha256(f.read()).hexdigest()
+    settings = json.dumps(
+        {"base_model": base_model, "max_length": max_length, "code": code_hash},
+        sort_keys=True
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+
+    tokenizer = None
+    chunks: List[str] = []
+    total_rows = 0
+    reused = 0
+
+    with open(dataset_path, "rb") as f:
+        while True:
+            raw = list(islice(f, chunk_rows))
+            if not raw:
+                break
+            lines = [line for line in raw if line.strip()]
+            if not lines:
+                continue
+
+            digest = hashlib.sha256(settings.encode())
+            for line in lines:
+                digest.update(line)
+            chunk_dir = os.path.join(cache_dir, digest.hexdigest()[:32])
+
+            if os.path.exists(chunk_dir):
+                reused += 1
+            else:
+                if tokenizer is None:
+                    tokenizer = load_tokenizer(base_model)
+                rows = [json.loads(line) for line in lines]
+                chunk = Dataset.from_list([{"messages": row["messages"]} for row in rows])
+                tokenized = tokenize_dataset(chunk, tokenizer, max_length, desc=f"Tokenizing chunk {len(chunks)}")
+                tmp_dir = chunk_dir + ".tmp"
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                tokenized.save_to_disk(tmp_dir)
+                os.replace(tmp_dir, chunk_dir)
+
+            chunks.append(os.path.abspath(chunk_dir))
+            total_rows += len(lines)
+
+    manifest = {
+        "dataset_path": os.path.abspath(dataset_path),
+        "base_model": base_model,
+        "max_length": max_length,
+        "rows": total_rows,
+        "chunks": chunks,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ Tokenized {total_rows} rows in {len(chunks)} chunks ({reused} reused from cache)")
+    return manifest
+
+
+def load_tokenized(manifest_path: str):
+    """Load a tokenized dataset written by tokenize_incremental (a DatasetDict)"""
+    from datasets import DatasetDict, concatenate_datasets, load_from_disk
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    parts = [load_from_disk(chunk) for chunk in manifest["chunks"]]
+    return DatasetDict({"train": concatenate_datasets(parts)})
+
+
+def strip_stats(dataset):
+    """Drop the supervision_report bookkeeping columns"""
+    return dataset.remove_columns([c for c in STATS_COLUMNS if c in dataset["train"].column_names])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tokenize HeySalad training data with a chunk cache"
+    )
+    parser.add_argument("--dataset", type=str, default="./data/training_data.jsonl", help="JSONL conversations")
+    parser.add_argument("--manifest", type=str, default="./data/tokenized/manifest.json", help="Output manifest path")
+    parser.add_argument("--base-model", type=str, required=True, help="Tokenizer to use")
+    parser.add_argument("--max-length", type=int, default=512, help="Maximum sequence length")
+    parser.add_argument("--cache-dir", type=str, default="./.pipeline/tokenized", help="Chunk cache directory")
+
+    args = parser.parse_args()
+    tokenize_incremental(args.dataset, args.manifest, args.base_model, args.max_length, args.cache_dir)
+
+if __name__ == "__main__":
+    main()
@@ -5,27 +5,53 @@ Fine-tunes Llama 2 7B using LoRA for HeySalad-specific tasks
 """
 
 import os
+import json
+import argparse
+import resource
+import sys
+import importlib.util
+import time
 import torch
 from datetime import datetime
 from transformers import (
     AutoModelForCausalLM,
-    AutoTokenizer,
     TrainingArguments,
     Trainer,
-    DataCollatorForLanguageModeling,
+    TrainerCallback,
+    DataCollatorForSeq2Seq,
 )
-from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from datasets import load_dataset
+from peft import LoraConfig, PeftModel, get_peft_model, prepare_model_for_kbit_training
+from datasets import Dataset, DatasetDict, load_dataset
 import wandb
 
+from cpu_backend import configure_cpu_threads, cpu_supports_bf16, upcast_trainable_params
+from training_manifest import dataset_fingerprint, load_manifest, select_continuation_rows, write_manifest
+from weight_cache import load_cached_8bit_model, load_cached_model
+from tokenization import (
+    IGNORE_INDEX,
+    load_tokenizer,
+    load_tokenized,
+    strip_stats,
+    supervision_report,
+    tokenize_dataset,
+)
+
 # Configuration
 CONFIG = {
     "base_model": "meta-llama/Llama-2-7b-chat-hf",
     "output_dir": "./heysalad-7b",
+    "timestamp_output_dir": True,  # Append -YYYYmmdd-HHMMSS to output_dir
     "dataset_path": "./data/training_data.jsonl",
+    "dataset_from_cli": False,  # --dataset given; otherwise continuing reuses the parent's dataset
+    "tokenized_manifest": None,  # Pre-tokenized dataset from tokenization.py
     "model_name": "heysalad-7b",
     "version": "v0.1.0",
 
+    # Continued training
+    "resume_adapter": None,  # Existing adapter dir to continue from on newly appended rows
+    "replay_ratio": 0.1,  # Old rows replayed per new row when continuing
+    "seed": 42,
+
     # LoRA parameters
     "lora_r": 16,
     "lora_alpha": 32,
@@ -41,16 +67,24 @@ CONFIG = {
     "warmup_steps": 50,
 
     # Optimization
-    "use_8bit": True,
+    "use_8bit": True,  # GPU only, needs bitsandbytes
     "use_flash_attention": False,  # Set to True if available
+    "device": "auto",  # "auto", "cuda" or "cpu"
+    "torch_compile": False,  # torch.compile the model (CPU or GPU)
+    "cpu_threads": None,  # Intra-op threads on CPU (default: physical cores)
+    "numa_node": None,  # Pin CPU training to one NUMA node
+    "weight_cache_dir": "./.weight_cache",  # Prepared per-layer base weights, mmapped on later runs (None to disable)
 
     # Logging
     "use_wandb": False,  # Set to True and add WANDB_API_KEY
     "logging_steps": 10,
     "save_steps": 100,
-    "eval_steps": 100,
 }
 
+# Process start and model-load timings, reported in results.json
+PROCESS_START = time.perf_counter()
+LOAD_STATS = {}
+
 def print_banner():
     """Print HeySalad training banner"""
     print("=" * 60)
@@ -72,34 +106,97 @@ def setup_wandb():
     else:
         print("⚠️  Weights & Biases disabled")
 
+def resolve_device():
+    """Pick the training device from CONFIG["device"]"""
+    if CONFIG["device"] == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    return CONFIG["device"]
+
+def has_bitsandbytes():
+    """bitsandbytes is optional; 8-bit loading and paged optimizers need it"""
+    return importlib.util.find_spec("bitsandbytes") is not None
+
+def setup_device():
+    """Tune CPU threads before any model work when training on CPU"""
+    device = resolve_device()
+    print(f"\n🖥️  Device: {device}")
+    if device != "cpu":
+        return
+
+    settings = configure_cpu_threads(CONFIG["cpu_threads"], numa_node=CONFIG["numa_node"])
+    print(f"   Threads: {settings['intra_op_threads']} intra-op, {settings['inter_op_threads']} inter-op")
+    print(f"   NUMA: {settings['numa_nodes']} node(s), pinned to {settings['numa_node']}")
+    print(f"   Native bf16: {settings['bf16']}")
+
 def load_model_and_tokenizer():
     """Load base model and tokenizer"""
     print("\n📥 Loading base model and tokenizer...")
 
     # Load tokenizer
-    tokenizer = AutoTokenizer.from_pretrained(CONFIG["base_model"])
-    tokenizer.pad_token = tokenizer.eos_token
-    tokenizer.padding_side = "right"
+    tokenizer = load_tokenizer(CONFIG["base_model"])
+    start = time.perf_counter()
+    LOAD_STATS["weight_cache"] = "off"
+
+    if resolve_device() == "cuda":
+        quantize = CONFIG["use_8bit"] and has_bitsandbytes()
+        if CONFIG["use_8bit"] and not quantize:
+            print("⚠️  bitsandbytes not installed, loading in 16-bit")
+
+        if CONFIG["weight_cache_dir"] and quantize:
+            # Reuses the already-quantized int8 weights after the first run
+            model, stats = load_cached_8bit_model(CONFIG["base_model"], CONFIG["weight_cache_dir"])
+            LOAD_STATS.update(stats)
+        elif CONFIG["weight_cache_dir"]:
+            model, stats = load_cached_model(CONFIG["base_model"], torch.float16, CONFIG["weight_cache_dir"], "cuda")
+            LOAD_STATS.update(stats)
+        else:
+            # Load model with quantization
+            model = AutoModelForCausalLM.from_pretrained(
+                CONFIG["base_model"],
+                load_in_8bit=quantize,
+                device_map="auto",
+                torch_dtype=torch.float16,
+            )
 
-    # Load model with quantization
-    model = AutoModelForCausalLM.from_pretrained(
-        CONFIG["base_model"],
-        load_in_8bit=CONFIG["use_8bit"],
-        device_map="auto",
-        torch_dtype=torch.float16,
-    )
+        # Prepare for training
+        if quantize:
+            model = prepare_model_for_kbit_training(model)
+        else:
+            # prepare_model_for_kbit_training would upcast every 16-bit weight to fp32
+            model.gradient_checkpointing_enable()
+            model.enable_input_require_grads()
+        memory = "8-bit" if quantize else "16-bit"
+    else:
+        # Frozen base weights in bf16 where the CPU computes it natively, else fp32
+        dtype = torch.bfloat16 if cpu_supports_bf16() else torch.float32
+        if CONFIG["weight_cache_dir"]:
+            model, stats = load_cached_model(CONFIG["base_model"], dtype, CONFIG["weight_cache_dir"], "cpu")
+            LOAD_STATS.update(stats)
+        else:
+            model = AutoModelForCausalLM.from_pretrained(
+                CONFIG["base_model"],
+                torch_dtype=dtype,
+                low_cpu_mem_usage=True,
+            )
+        memory = "bf16" if dtype == torch.bfloat16 else "fp32"
 
-    # Prepare for training
-    model = prepare_model_for_kbit_training(model)
+    LOAD_STATS["model_load_s"] = time.perf_counter() - start - LOAD_STATS.get("convert_s", 0.0)
+    LOAD_STATS["base_params"] = sum(p.numel() for p in model.parameters())
 
     print(f"✅ Model loaded: {CONFIG['base_model']}")
-    print(f"   Memory: {'8-bit' if CONFIG['use_8bit'] else '16-bit'}")
+    print(f"   Memory: {memory}")
     print(f"   Device: {next(model.parameters()).device}")
+    print(f"⏱️  Model load: {LOAD_STATS['model_load_s']:.1f}s (weight cache: {LOAD_STATS['weight_cache']})")
+    if LOAD_STATS.get("convert_s"):
+        print(f"   One-time cache conversion: {LOAD_STATS['convert_s']:.1f}s")
 
     return model, tokenizer
 
 def setup_lora(model):
     """Configure and apply LoRA"""
+    if CONFIG["resume_adapter"]:
+        return load_lora(model)
+
     print("\n🔧 Setting up LoRA...")
 
     lora_config = LoraConfig(
@@ -113,6 +210,9 @@ def setup_lora(model):
 
     model = get_peft_model(model, lora_config)
 
+    # LoRA weights inherit a 16-bit base's dtype; keep them fp32 for the optimizer
+    upcast_trainable_params(model)
+
     # Print trainable parameters
     trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
     total_params = sum(p.numel() for p in model.parameters())
@@ -126,62 +226,141 @@ def setup_lora(model):
 
     return model
 
-def load_and_prepare_dataset(tokenizer):
-    """Load and tokenize dataset"""
-    print("\n📚 Loading dataset...")
+def effective_batch_size():
+    """Sequences per optimizer step"""
+    return CONFIG["batch_size"] * CONFIG["gradient_accumulation_steps"]
 
-    # Load dataset
-    dataset = load_dataset('json', data_files={
-        'train': CONFIG["dataset_path"]
-    })
+def load_lora(model):
+    """Attach an existing adapter for continued training"""
+    print(f"\n🔧 Loading adapter to continue: {CONFIG['resume_adapter']}")
 
-    print(f"✅ Dataset loaded: {len(dataset['train'])} examples")
+    model = PeftModel.from_pretrained(model, CONFIG["resume_adapter"], is_trainable=True)
+    # LoRA weights inherit a 16-bit base's dtype; keep them fp32 for the optimizer
+    upcast_trainable_params(model)
 
-    # Tokenize function
-    def tokenize_function(examples):
-        texts = []
-        for messages in examples['messages']:
-            # Apply chat template
-            text = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=False
-            )
-            texts.append(text)
-
-        # Tokenize
-        tokenized = tokenizer(
-            texts,
-            truncation=True,
-            max_length=CONFIG["max_length"],
-            padding="max_length",
-            return_tensors=None,
+    trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    print(f"✅ Adapter loaded: {trainable_params:,} trainable params")
+
+    return model
+
+def prepare_continuation():
+    """Select rows appended since the parent adapter's run (continue mode only)
+
+    Runs before the base model is loaded so an up-to-date adapter exits in seconds.
+    """
+    if not CONFIG["resume_adapter"]:
+        return None
+    if CONFIG["tokenized_manifest"]:
+        print("❌ --resume-adapter selects raw rows and cannot be combined with --tokenized")
+        sys.exit(1)
+
+    print("\n🔁 Continue-training mode")
+    try:
+        parent = load_manifest(CONFIG["resume_adapter"])
+        if parent["base_model"] != CONFIG["base_model"]:
+            print(f"   Using parent base model: {parent['base_model']}")
+            CONFIG["base_model"] = parent["base_model"]
+        if not CONFIG["dataset_from_cli"] and parent.get("dataset_path"):
+            CONFIG["dataset_path"] = parent["dataset_path"]
+        print(f"   Dataset: {CONFIG['dataset_path']}")
+
+        selection = select_continuation_rows(
+            CONFIG["dataset_path"], parent, CONFIG["replay_ratio"], CONFIG["seed"]
         )
+    except (ValueError, FileNotFoundError) as e:
+        print(f"❌ Cannot continue from {CONFIG['resume_adapter']}: {e}")
+        sys.exit(1)
+    selection["parent"] = parent
+
+    print(f"   Parent saw: {parent['dataset']['rows']} rows")
+    print(f"   New rows: {len(selection['new_rows'])}")
+    print(f"   Replay rows: {len(selection['replay_rows'])}")
+
+    if not selection["new_rows"]:
+        print("✅ No new rows since the parent adapter; nothing to train")
+        sys.exit(0)
+
+    return selection
+
+def load_and_prepare_dataset(tokenizer, selection=None):
+    """Load and tokenize dataset
+
+    Returns the tokenized dataset and a record of which rows it came from
+    for the training manifest.
+    """
+    print("\n📚 Loading dataset...")
 
-        # Set labels for language modeling
-        tokenized["labels"] = tokenized["input_ids"].copy()
+    # Reuse a dataset pre-tokenized by the pipeline if one was given
+    if CONFIG["tokenized_manifest"]:
+        with open(CONFIG["tokenized_manifest"]) as f:
+            manifest = json.load(f)
+        tokenized_dataset = load_tokenized(CONFIG["tokenized_manifest"])
+        print(f"✅ Pre-tokenized dataset loaded: {len(tokenized_dataset['train'])} windows")
+        supervision_report(tokenized_dataset["train"], CONFIG["max_length"], effective_batch_size())
+        data_info = {
+            "dataset_path": manifest["dataset_path"],
+            "dataset": dataset_fingerprint(manifest["dataset_path"], manifest["rows"]),
+            "trained_rows": manifest["rows"],
+        }
+        return strip_stats(tokenized_dataset), data_info
+
+    if selection:
+        # Only the appended rows plus a replay sample of older ones
+        rows = selection["new_rows"] + selection["replay_rows"]
+        dataset = DatasetDict({
+            "train": Dataset.from_list([{"messages": row["messages"]} for row in rows]).shuffle(seed=CONFIG["seed"])
+        })
+        data_info = {
+            "dataset_path": CONFIG["dataset_path"],
+            "dataset": selection["dataset"],
+            "trained_rows": len(rows),
+            "replay_rows": len(selection["replay_rows"]),
+        }
+    else:
+        # Load dataset
+        dataset = load_dataset('json', data_files={
+            'train': CONFIG["dataset_path"]
+        })
+        data_info = {
+            "dataset_path": CONFIG["dataset_path"],
+            "dataset": dataset_fingerprint(CONFIG["dataset_path"], len(dataset["train"])),
+            "trained_rows": len(dataset["train"]),
+        }
 
-        return tokenized
+    print(f"✅ Dataset loaded: {len(dataset['train'])} examples")
 
     # Tokenize dataset
     print("🔄 Tokenizing dataset...")
-    tokenized_dataset = dataset.map(
-        tokenize_function,
-        batched=True,
-        remove_columns=dataset["train"].column_names,
-        desc="Tokenizing"
-    )
+    tokenized_dataset = tokenize_dataset(dataset, tokenizer, CONFIG["max_length"])
 
-    print(f"✅ Dataset tokenized")
+    print(f"✅ Dataset tokenized: {len(tokenized_dataset['train'])} windows")
+    supervision_report(tokenized_dataset["train"], CONFIG["max_length"], effective_batch_size())
+    tokenized_dataset = strip_stats(tokenized_dataset)
 
-    return tokenized_dataset
+    return tokenized_dataset, data_info
 
 def setup_training_args():
     """Configure training arguments"""
     print("\n⚙️  Setting up training arguments...")
 
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    output_dir = f"{CONFIG['output_dir']}-{timestamp}"
+    output_dir = CONFIG["output_dir"]
+    if CONFIG["timestamp_output_dir"]:
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output_dir = f"{output_dir}-{timestamp}"
+
+    if resolve_device() == "cuda":
+        precision = {"fp16": True}
+        optim = "paged_adamw_8bit" if has_bitsandbytes() else "adamw_torch_fused"
+    else:
+        # bf16 autocast where the CPU supports it natively, fp32 otherwise
+        precision = {"use_cpu": True, "bf16": cpu_supports_bf16()}
+        optim = "adamw_torch"
+
+    # Continued runs are short, so a fixed warmup could swallow the whole schedule
+    if CONFIG["resume_adapter"]:
+        warmup = {"warmup_ratio": 0.1}
+    else:
+        warmup = {"warmup_steps": CONFIG["warmup_steps"]}
 
     training_args = TrainingArguments(
         output_dir=output_dir,
@@ -191,14 +370,12 @@ def setup_training_args():
         learning_rate=CONFIG["learning_rate"],
         logging_steps=CONFIG["logging_steps"],
         save_steps=CONFIG["save_steps"],
-        evaluation_strategy="steps",
-        eval_steps=CONFIG["eval_steps"],
-        warmup_steps=CONFIG["warmup_steps"],
-        fp16=True,
-        optim="paged_adamw_8bit",
+        optim=optim,
+        torch_compile=CONFIG["torch_compile"],
         report_to="wandb" if CONFIG["use_wandb"] else "none",
         save_total_limit=3,
-        load_best_model_at_end=True,
+        **precision,
+        **warmup,
     )
 
     print(f"✅ Training arguments configured")
@@ -206,6 +383,8 @@ def setup_training_args():
     print(f"   Epochs: {CONFIG['num_epochs']}")
     print(f"   Batch size: {CONFIG['batch_size']}")
     print(f"   Learning rate: {CONFIG['learning_rate']}")
+    print(f"   Precision: {'bf16' if precision.get('bf16') else 'fp16' if precision.get('fp16') else 'fp32'}")
+    print(f"   Optimizer: {optim}")
 
     return training_args
 
@@ -214,10 +393,12 @@ def train_model(model, tokenizer, dataset, training_args):
     print("\n🚀 Starting training...")
     print("=" * 60)
 
-    # Data collator
-    data_collator = DataCollatorForLanguageModeling(
+    # Data collator: pad each batch to its longest window, keeping assistant-only labels
+    data_collator = DataCollatorForSeq2Seq(
         tokenizer=tokenizer,
-        mlm=False,
+        padding=True,
+        pad_to_multiple_of=8,
+        label_pad_token_id=IGNORE_INDEX,
     )
 
     # Trainer
@@ -226,6 +407,7 @@ def train_model(model, tokenizer, dataset, training_args):
         args=training_args,
         train_dataset=dataset["train"],
         data_collator=data_collator,
+        callbacks=[FirstStepTimer()],
     )
 
     # Train!
@@ -236,9 +418,66 @@ def train_model(model, tokenizer, dataset, training_args):
     print(f"   Training loss: {train_result.training_loss:.4f}")
     print(f"   Training time: {train_result.metrics['train_runtime']:.2f}s")
 
+    save_training_results(trainer, train_result, dataset)
+
     return trainer
 
-def save_model(trainer, tokenizer):
+class FirstStepTimer(TrainerCallback):
+    """Record seconds from process start to the end of the first optimizer step"""
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if "time_to_first_step_s" not in LOAD_STATS:
+            LOAD_STATS["time_to_first_step_s"] = time.perf_counter() - PROCESS_START
+            print(f"⏱️  Time to first step: {LOAD_STATS['time_to_first_step_s']:.1f}s")
+
+def peak_memory_gb():
+    """Peak accelerator memory if training on GPU, otherwise peak host RSS"""
+    if resolve_device() == "cuda":
+        return torch.cuda.max_memory_allocated() / 1e9
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6
+
+def training_hardware():
+    """Name of the device this run trained on, for results.json"""
+    if resolve_device() == "cuda":
+        return torch.cuda.get_device_name(0)
+    return "cpu"
+
+def save_training_results(trainer, train_result, dataset):
+    """Write measured training numbers to results.json for the model card"""
+    output_dir = trainer.args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    metrics = train_result.metrics
+    tokens_per_epoch = sum(sum(mask) for mask in dataset["train"]["attention_mask"])
+    train_tokens = int(tokens_per_epoch * trainer.args.num_train_epochs)
+    runtime = metrics["train_runtime"]
+
+    results = {
+        "training": {
+            "base_model": CONFIG["base_model"],
+            "train_examples": len(dataset["train"]),
+            "epochs": trainer.args.num_train_epochs,
+            "train_tokens": train_tokens,
+            "train_runtime_s": runtime,
+            "tokens_per_sec": train_tokens / runtime if runtime else 0.0,
+            "peak_memory_gb": peak_memory_gb(),
+            "train_loss": train_result.training_loss,
+            "hardware": training_hardware(),
+            "base_params": LOAD_STATS.get("base_params"),
+            "model_load_s": LOAD_STATS.get("model_load_s"),
+            "weight_cache": LOAD_STATS.get("weight_cache"),
+            "time_to_first_step_s": LOAD_STATS.get("time_to_first_step_s"),
+        }
+    }
+
+    results_path = os.path.join(output_dir, "results.json")
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"📊 Training results written to: {results_path}")
+
+def save_model(trainer, tokenizer, data_info, selection=None):
     """Save the trained model"""
     print("\n💾 Saving model...")
 
@@ -249,10 +488,23 @@ def save_model(trainer, tokenizer):
     tokenizer.save_pretrained(output_dir)
 
     # Save config
-    import json
     with open(f"{output_dir}/training_config.json", "w") as f:
         json.dump(CONFIG, f, indent=2)
 
+    # Save manifest: which rows were trained, and the adapter's lineage
+    manifest = write_manifest(
+        output_dir,
+        data_info["dataset_path"],
+        data_info["dataset"],
+        CONFIG["base_model"],
+        CONFIG["version"],
+        data_info["trained_rows"],
+        parent_dir=CONFIG["resume_adapter"],
+        parent=selection["parent"] if selection else None,
+        replay_rows=data_info.get("replay_rows", 0),
+    )
+    print(f"📜 Manifest: {manifest['dataset']['rows']} rows seen, lineage depth {len(manifest['lineage'])}")
+
     print(f"✅ Model saved to: {output_dir}")
 
     # Instructions for next steps
@@ -264,16 +516,120 @@ def save_model(trainer, tokenizer):
     print(f"      python test_heysalad.py --model {output_dir}")
     print(f"   2. Deploy with vLLM:")
     print(f"      python -m vllm.entrypoints.openai.api_server --model {output_dir}")
+    print(f"      or locally: python serve_heysalad.py --base-model {CONFIG['base_model']} --adapter {CONFIG['model_name']}={output_dir}")
     print(f"   3. Push to Hugging Face:")
     print(f"      python push_to_hub.py --model {output_dir}")
     print()
 
+def parse_args():
+    """Apply command-line overrides to CONFIG"""
+    parser = argparse.ArgumentParser(description="Train the HeySalad model")
+    parser.add_argument(
+        "--dataset",
+        type=str,
+        default=None,
+        help=f"Training data JSONL (default: {CONFIG['dataset_path']}, or the parent's when continuing)"
+    )
+    parser.add_argument(
+        "--tokenized",
+        type=str,
+        default=None,
+        help="Manifest of a pre-tokenized dataset (skips tokenization)"
+    )
+    parser.add_argument(
+        "--base-model",
+        type=str,
+        default=None,
+        help=f"Base model (default: {CONFIG['base_model']})"
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        choices=["auto", "cuda", "cpu"],
+        default=None,
+        help="Training device (default: cuda if available)"
+    )
+    parser.add_argument(
+        "--torch-compile",
+        action="store_true",
+        help="Compile the model with torch.compile"
+    )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=None,
+        help="Intra-op threads for CPU training (default: physical cores)"
+    )
+    parser.add_argument(
+        "--numa-node",
+        type=int,
+        default=None,
+        help="Pin CPU training to one NUMA node"
+    )
+    parser.add_argument(
+        "--resume-adapter",
+        type=str,
+        default=None,
+        help="Continue training this adapter on rows appended since its run"
+    )
+    parser.add_argument(
+        "--replay-ratio",
+        type=float,
+        default=None,
+        help=f"Old rows replayed per new row when continuing (default: {CONFIG['replay_ratio']})"
+    )
+    parser.add_argument(
+        "--no-weight-cache",
+        action="store_true",
+        help="Load the base with from_pretrained instead of the mmap weight cache"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default=None,
+        help="Exact output directory (default: timestamped ./heysalad-7b-*)"
+    )
+
+    args = parser.parse_args()
+
+    if args.dataset:
+        CONFIG["dataset_path"] = args.dataset
+        CONFIG["dataset_from_cli"] = True
+    if args.base_model:
+        CONFIG["base_model"] = args.base_model
+    if args.resume_adapter:
+        CONFIG["resume_adapter"] = args.resume_adapter
+    if args.replay_ratio is not None:
+        if args.replay_ratio < 0:
+            parser.error(f"--replay-ratio must be >= 0, got {args.replay_ratio}")
+        CONFIG["replay_ratio"] = args.replay_ratio
+    if args.device:
+        CONFIG["device"] = args.device
+    if args.torch_compile:
+        CONFIG["torch_compile"] = True
+    if args.cpu_threads:
+        CONFIG["cpu_threads"] = args.cpu_threads
+    if args.numa_node is not None:
+        CONFIG["numa_node"] = args.numa_node
+    if args.tokenized:
+        CONFIG["tokenized_manifest"] = args.tokenized
+    if args.no_weight_cache:
+        CONFIG["weight_cache_dir"] = None
+    if args.output_dir:
+        CONFIG["output_dir"] = args.output_dir
+        CONFIG["timestamp_output_dir"] = False
+
 def main():
     """Main training pipeline"""
+    parse_args()
     print_banner()
 
     # Setup
     setup_wandb()
+    setup_device()
+
+    # Pick newly appended rows when continuing from an adapter
+    selection = prepare_continuation()
 
     # Load model and tokenizer
     model, tokenizer = load_model_and_tokenizer()
@@ -282,7 +638,7 @@ def main():
     model = setup_lora(model)
 
     # Load and prepare dataset
-    dataset = load_and_prepare_dataset(tokenizer)
+    dataset, data_info = load_and_prepare_dataset(tokenizer, selection)
 
     # Setup training
     training_args = setup_training_args()
@@ -291,7 +647,7 @@ def main():
     trainer = train_model(model, tokenizer, dataset, training_args)
 
     # Save
-    save_model(trainer, tokenizer)
+    save_model(trainer, tokenizer, data_info, selection)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+HeySalad Multi-Adapter Training
+Trains several LoRA adapters in one process over a single shared, frozen base model
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+from typing import List
+
+import torch
+from torch.utils.data import DataLoader
+from transformers import DataCollatorForSeq2Seq, get_linear_schedule_with_warmup
+from peft import LoraConfig, get_peft_model
+from datasets import load_dataset
+
+from train_heysalad import (
+    CONFIG, LOAD_STATS, load_model_and_tokenizer, peak_memory_gb, resolve_device, setup_device, training_hardware,
+)
+from cpu_backend import cpu_supports_bf16, upcast_trainable_params
+from training_manifest import dataset_fingerprint, write_manifest
+from tokenization import IGNORE_INDEX, strip_stats, supervision_report, tokenize_dataset
+
+# Per-adapter keys that fall back to CONFIG when an adapter spec leaves them out
+ADAPTER_DEFAULTS = (
+    "lora_r",
+    "lora_alpha",
+    "lora_dropout",
+    "lora_target_modules",
+    "num_epochs",
+    "batch_size",
+    "gradient_accumulation_steps",
+    "learning_rate",
+    "warmup_steps",
+)
+
+SCHEDULES = ("round-robin", "mixed")
+
+
+def load_adapter_specs(path: str) -> List[dict]:
+    """Read the adapter list from a JSON file
+
+    The file holds {"adapters": [...]} (or just the list). Each entry needs a
+    "name" and a "dataset_path"; "output_dir" defaults to ./heysalad-<name>,
+    and any key from ADAPTER_DEFAULTS overrides CONFIG for that adapter.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    specs = data["adapters"] if isinstance(data, dict) else data
+
+    names = set()
+    for spec in specs:
+        for key in ("name", "dataset_path"):
+            if key not in spec:
+                raise ValueError(f"Adapter spec is missing '{key}': {spec}")
+        if spec["name"] in names:
+            raise ValueError(f"Duplicate adapter name: {spec['name']}")
+        names.add(spec["name"])
+        spec.setdefault("output_dir", f"./heysalad-{spec['name']}")
+        for key in ADAPTER_DEFAULTS:
+            spec.setdefault(key, CONFIG[key])
+
+    if not specs:
+        raise ValueError(f"No adapters listed in {path}")
+    return specs
+
+
+def attach_adapters(model, specs: List[dict]):
+    """Wrap the base model once and add one named LoRA adapter per spec"""
+    print(f"\n🔧 Attaching {len(specs)} adapters to the shared base...")
+
+    for i, spec in enumerate(specs):
+        lora_config = LoraConfig(
+            r=spec["lora_r"],
+            lora_alpha=spec["lora_alpha"],
+            target_modules=spec["lora_target_modules"],
+            lora_dropout=spec["lora_dropout"],
+            bias="none",
+            task_type="CAUSAL_LM"
+        )
+        if i == 0:
+            model = get_peft_model(model, lora_config, adapter_name=spec["name"])
+        else:
+            model.add_adapter(spec["name"], lora_config)
+
+    # add_adapter freezes everything but the active adapter; make all LoRA weights
+    # trainable so they are upcast and handed to their optimizers
+    for name, param in model.named_parameters():
+        if "lora_" in name:
+            param.requires_grad = True
+    upcast_trainable_params(model)
+
+    for spec in specs:
+        params = adapter_parameters(model, spec["name"])
+        spec["trainable_params"] = sum(p.numel() for p in params)
+        print(f"   - {spec['name']}: r={spec['lora_r']}, {spec['trainable_params']:,} trainable params")
+
+    return model
+
+
+def adapter_parameters(model, adapter_name: str) -> List[torch.nn.Parameter]:
+    """LoRA weights belonging to one adapter (named *.lora_A.<adapter>.weight etc.)"""
+    markers = (f".lora_A.{adapter_name}.", f".lora_B.{adapter_name}.")
+    return [p for n, p in model.named_parameters() if any(m in n for m in markers)]
+
+
+def frozen_base_bytes(model) -> int:
+    """Bytes held by the frozen base weights, i.e. what each separate run would reload"""
+    return sum(
+        p.numel() * p.element_size()
+        for n, p in model.named_parameters()
+        if "lora_" not in n
+    )
+
+
+def load_adapter_dataset(spec: dict, tokenizer):
+    """Tokenize one adapter's dataset; returns (train split, fingerprint)"""
+    print(f"\n📚 [{spec['name']}] Loading dataset: {spec['dataset_path']}")
+    dataset = load_dataset("json", data_files={"train": spec["dataset_path"]})
+    fingerprint = dataset_fingerprint(spec["dataset_path"], len(dataset["train"]))
+
+    tokenized = tokenize_dataset(dataset, tokenizer, CONFIG["max_length"])
+    if not len(tokenized["train"]):
+        raise ValueError(f"No trainable windows in {spec['dataset_path']}")
+    print(f"✅ [{spec['name']}] {len(dataset['train'])} examples -> {len(tokenized['train'])} windows")
+    supervision_report(
+        tokenized["train"], CONFIG["max_length"], spec["batch_size"] * spec["gradient_accumulation_steps"]
+    )
+    return strip_stats(tokenized)["train"], fingerprint
+
+
+class AdapterRun:
+    """Data, optimizer and counters for one adapter being trained"""
+
+    def __init__(self, spec: dict, model, train_data, fingerprint: dict, collator, device: str):
+        self.spec = spec
+        self.name = spec["name"]
+        self.train_data = train_data
+        self.fingerprint = fingerprint
+        self.loader = DataLoader(
+            train_data,
+            batch_size=spec["batch_size"],
+            shuffle=True,
+            collate_fn=collator,
+            generator=torch.Generator().manual_seed(CONFIG["seed"]),
+        )
+
+        self.accumulation = spec["gradient_accumulation_steps"]
+        steps_per_epoch = max(1, len(self.loader) // self.accumulation)
+        self.total_steps = steps_per_epoch * spec["num_epochs"]
+
+        self.optimizer = torch.optim.AdamW(adapter_parameters(model, self.name), lr=spec["learning_rate"])
+        self.scheduler = get_linear_schedule_with_warmup(
+            self.optimizer, min(spec["warmup_steps"], self.total_steps // 10), self.total_steps
+        )
+        # fp16 autocast on GPU needs loss scaling; CPU bf16 does not
+        self.scaler = torch.cuda.amp.GradScaler() if device == "cuda" else None
+
+        self.epoch = 0
+        self.batches = iter(self.loader)
+        self.step = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.losses: List[float] = []
+
+    @property
+    def done(self) -> bool:
+        return self.step >= self.total_steps
+
+    @property
+    def remaining(self) -> int:
+        return self.total_steps - self.step
+
+    def next_batch(self):
+        try:
+            return next(self.batches)
+        except StopIteration:
+            self.epoch += 1
+            self.batches = iter(self.loader)
+            return next(self.batches)
+
+
+def autocast_context(device: str, cpu_bf16: bool):
+    """Mixed precision matching train_heysalad: fp16 on GPU, bf16 on capable CPUs"""
+    if device == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16)
+    return torch.autocast("cpu", dtype=torch.bfloat16, enabled=cpu_bf16)
+
+
+def train_step(model, run: AdapterRun, device: str, cpu_bf16: bool) -> float:
+    """One optimizer step (gradient_accumulation_steps micro-batches) for one adapter"""
+    model.set_adapter(run.name)
+    model.train()
+
+    start = time.perf_counter()
+    total_loss = 0.0
+    for _ in range(run.accumulation):
+        batch = {k: v.to(model.device) for k, v in run.next_batch().items()}
+        with autocast_context(device, cpu_bf16):
+            loss = model(**batch).loss / run.accumulation
+        if run.scaler:
+            run.scaler.scale(loss).backward()
+        else:
+            loss.backward()
+        total_loss += loss.item()
+        run.tokens += int(batch["attention_mask"].sum())
+
+    if run.scaler:
+        run.scaler.step(run.optimizer)
+        run.scaler.update()
+    else:
+        run.optimizer.step()
+    run.scheduler.step()
+    run.optimizer.zero_grad(set_to_none=True)
+
+    if device == "cuda":
+        torch.cuda.synchronize()
+    run.seconds += time.perf_counter() - start
+    run.step += 1
+    run.losses.append(total_loss)
+    return total_loss
+
+
+def train_adapters(model, runs: List[AdapterRun], schedule: str, device: str):
+    """Interleave optimizer steps across adapters until each has finished its epochs
+
+    round-robin: one step per adapter in turn.
+    mixed: each step goes to an adapter drawn at random, weighted by its
+    remaining steps, so adapters with more data get proportionally more
+    turns and all of them finish together.
+    """
+    print(f"\n🚀 Training {len(runs)} adapters ({schedule})...")
+    rng = random.Random(CONFIG["seed"])
+    cpu_bf16 = device == "cpu" and cpu_supports_bf16()
+    order = 0
+
+    while True:
+        active = [run for run in runs if not run.done]
+        if not active:
+            break
+
+        if schedule == "round-robin":
+            run = active[order % len(active)]
+            order += 1
+        else:
+            run = rng.choices(active, weights=[r.remaining for r in active])[0]
+
+        loss = train_step(model, run, device, cpu_bf16)
+        if run.step % CONFIG["logging_steps"] == 0 or run.done:
+            print(f"   [{run.name}] step {run.step}/{run.total_steps} "
+                  f"epoch {run.epoch + 1} loss {loss:.4f}")
+
+
+def report(runs: List[AdapterRun], base_bytes: int, wall_seconds: float) -> dict:
+    """Per-adapter throughput and the memory a separate run per adapter would have cost"""
+    peak = peak_memory_gb()
+    base_gb = base_bytes / 1e9
+    saved_gb = base_gb * (len(runs) - 1)
+
+    print("\n| Adapter | Steps | Tokens | Train time (s) | Tokens/sec | Final loss |")
+    print("|---------|-------|--------|----------------|------------|------------|")
+    adapters = {}
+    for run in runs:
+        rate = run.tokens / run.seconds if run.seconds else 0.0
+        final_loss = run.losses[-1] if run.losses else None
+        adapters[run.name] = {
+            "steps": run.step,
+            "train_tokens": run.tokens,
+            "train_runtime_s": run.seconds,
+            "tokens_per_sec": rate,
+            "train_loss": sum(run.losses) / len(run.losses) if run.losses else None,
+        }
+        loss_text = f"{final_loss:.4f}" if final_loss is not None else "-"
+        print(f"| {run.name} | {run.step} | {run.tokens:,} | {run.seconds:.1f} | {rate:,.0f} | {loss_text} |")
+
+    total_tokens = sum(run.tokens for run in runs)
+    print(f"\n⏱️  Wall time: {wall_seconds:.1f}s, {total_tokens / wall_seconds if wall_seconds else 0:,.0f} tokens/sec overall")
+    print(f"💾 Peak memory: {peak:.2f} GB with one {base_gb:.2f} GB base shared by {len(runs)} adapters")
+    print(f"   Separate runs would each load the base: ~{saved_gb:.2f} GB saved "
+          f"({peak + saved_gb:.2f} GB total across {len(runs)} runs)")
+
+    return {
+        "adapters": adapters,
+        "wall_time_s": wall_seconds,
+        "peak_memory_gb": peak,
+        "base_weights_gb": base_gb,
+        "memory_saved_gb": saved_gb,
+    }
+
+
+def save_adapters(model, tokenizer, runs: List[AdapterRun], summary: dict, config_path: str):
+    """Save each adapter on its own, with tokenizer, results and manifest"""
+    print("\n💾 Saving adapters...")
+    hardware = training_hardware()
+
+    for run in runs:
+        output_dir = run.spec["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+
+        # PEFT writes non-default adapters to <dir>/<name>/; keep the usual single-adapter layout
+        model.save_pretrained(output_dir, selected_adapters=[run.name])
+        nested = os.path.join(output_dir, run.name)
+        if os.path.isdir(nested):
+            for filename in os.listdir(nested):
+                os.replace(os.path.join(nested, filename), os.path.join(output_dir, filename))
+            os.rmdir(nested)
+        tokenizer.save_pretrained(output_dir)
+
+        with open(os.path.join(output_dir, "training_config.json"), "w") as f:
+            json.dump({**CONFIG, **run.spec, "adapter_config": config_path}, f, indent=2)
+
+        stats = summary["adapters"][run.name]
+        results = {
+            "training": {
+                "base_model": CONFIG["base_model"],
+                "base_params": LOAD_STATS.get("base_params"),
+                "train_examples": len(run.train_data),
+                "epochs": run.spec["num_epochs"],
+                "train_tokens": stats["train_tokens"],
+                "train_runtime_s": stats["train_runtime_s"],
+                "tokens_per_sec": stats["tokens_per_sec"],
+                "peak_memory_gb": summary["peak_memory_gb"],
+                "train_loss": stats["train_loss"],
+                "hardware": hardware,
+                "shared_base_adapters": len(runs),
+            }
+        }
+        with open(os.path.join(output_dir, "results.json"), "w") as f:
+            json.dump(results, f, indent=2)
+
+        write_manifest(
+            output_dir,
+            run.spec["dataset_path"],
+            run.fingerprint,
+            CONFIG["base_model"],
+            run.spec.get("version", CONFIG["version"]),
+            run.fingerprint["rows"],
+        )
+        print(f"✅ [{run.name}] saved to: {output_dir}")
+
+    print("\n📝 Next steps:")
+    for run in runs:
+        print(f"   python push_to_hub.py --model {run.spec['output_dir']}")
+
+
+def parse_args():
+    """Apply command-line overrides to CONFIG and return the parsed args"""
+    parser = argparse.ArgumentParser(
+        description="Train several HeySalad LoRA adapters over one shared base model"
+    )
+    parser.add_argument("--adapters", type=str, required=True, help="JSON file listing the adapters to train")
+    parser.add_argument("--schedule", type=str, choices=SCHEDULES, default="round-robin",
+                        help="How optimizer steps are interleaved across adapters")
+    parser.add_argument("--base-model", type=str, default=None, help=f"Base model (default: {CONFIG['base_model']})")
+    parser.add_argument("--device", type=str, choices=["auto", "cuda", "cpu"], default=None,
+                        help="Training device (default: cuda if available)")
+    parser.add_argument("--cpu-threads", type=int, default=None, help="Intra-op threads for CPU training")
+    parser.add_argument("--numa-node", type=int, default=None, help="Pin CPU training to one NUMA node")
+    parser.add_argument("--no-weight-cache", action="store_true",
+                        help="Load the base with from_pretrained instead of the mmap weight cache")
+    parser.add_argument("--results", type=str, default=None, help="Also write the combined report JSON here")
+
+    args = parser.parse_args()
+
+    if args.base_model:
+        CONFIG["base_model"] = args.base_model
+    if args.device:
+        CONFIG["device"] = args.device
+    if args.cpu_threads:
+        CONFIG["cpu_threads"] = args.cpu_threads
+    if args.numa_node is not None:
+        CONFIG["numa_node"] = args.numa_node
+    if args.no_weight_cache:
+        CONFIG["weight_cache_dir"] = None
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    try:
+        specs = load_adapter_specs(args.adapters)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Invalid adapter config: {e}")
+        sys.exit(1)
+    for spec in specs:
+        if not os.path.exists(spec["dataset_path"]):
+            print(f"❌ Dataset not found for {spec['name']}: {spec['dataset_path']}")
+            sys.exit(1)
+
+    print("=" * 60)
+    print("   🥗 HeySalad Multi-Adapter Training")
+    print(f"   Base: {CONFIG['base_model']}")
+    print(f"   Adapters: {', '.join(spec['name'] for spec in specs)}")
+    print(f"   Schedule: {args.schedule}")
+    print("=" * 60)
+
+    setup_device()
+    device = resolve_device()
+
+    # The base is loaded once; every adapter trains against these frozen weights
+    model, tokenizer = load_model_and_tokenizer()
+    base_bytes = frozen_base_bytes(model)
+    model = attach_adapters(model, specs)
+    if device == "cuda":
+        # 8-bit loading uses gradient checkpointing, which needs cache off
+        model.config.use_cache = False
+
+    collator = DataCollatorForSeq2Seq(
+        tokenizer, padding=True, pad_to_multiple_of=8, label_pad_token_id=IGNORE_INDEX
+    )
+    runs = []
+    for spec in specs:
+        train_data, fingerprint = load_adapter_dataset(spec, tokenizer)
+        runs.append(AdapterRun(spec, model, train_data, fingerprint, collator, device))
+
+    start = time.perf_counter()
+    train_adapters(model, runs, args.schedule, device)
+    summary = report(runs, base_bytes, time.perf_counter() - start)
+    summary.update({
+        "base_model": CONFIG["base_model"],
+        "schedule": args.schedule,
+        "created": datetime.now().isoformat(timespec="seconds"),
+    })
+
+    save_adapters(model, tokenizer, runs, summary, os.path.abspath(args.adapters))
+
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"📊 Combined report written to: {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+HeySalad Training Manifests
+Records what data an adapter was trained on so later runs can continue from it
+"""
+
+import os
+import json
+import random
+import hashlib
+from datetime import datetime
+from typing import List, Optional
+
+MANIFEST_FILENAME = "training_manifest.json"
+
+
+def _rows(path: str):
+    """Yield (index, raw line) for non-blank lines of a JSONL file"""
+    index = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield index, line
+                index += 1
+
+
+def dataset_fingerprint(path: str, rows: Optional[int] = None) -> dict:
+    """Row count and SHA-256 of the first `rows` rows (all rows by default)"""
+    digest = hashlib.sha256()
+    count = 0
+    for index, line in _rows(path):
+        if rows is not None and index >= rows:
+            break
+        digest.update(line.rstrip(b"\r\n"))
+        digest.update(b"\n")
+        count += 1
+    return {"rows": count, "sha256": digest.hexdigest()}
+
+
+def load_manifest(adapter_dir: str) -> dict:
+    """Load the manifest saved next to a trained adapter"""
+    path = os.path.join(adapter_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; was this adapter trained before manifests existed?")
+    with open(path) as f:
+        return json.load(f)
+
+
+def select_continuation_rows(dataset_path: str, parent: dict, replay_ratio: float = 0.0, seed: int = 42) -> dict:
+    """Pick the rows appended since the parent run plus an optional replay sample
+
+    The dataset must be append-only relative to the parent: its first
+    parent["dataset"]["rows"] rows have to hash to the recorded fingerprint.
+    The replay sample is drawn uniformly from those old rows, sized as
+    `replay_ratio` times the number of new rows.
+    """
+    if replay_ratio < 0:
+        raise ValueError(f"replay_ratio must be >= 0, got {replay_ratio}")
+    seen = parent["dataset"]["rows"]
+    prefix = dataset_fingerprint(dataset_path, seen)
+    if prefix["rows"] < seen or prefix["sha256"] != parent["dataset"]["sha256"]:
+        raise ValueError(
+            f"{dataset_path} is not an append-only extension of the data the adapter saw "
+            f"({seen} rows); run a full training instead"
+        )
+
+    new_rows: List[dict] = []
+    replay_rows: List[dict] = []
+    total = 0
+
+    # First pass counts rows so the replay sample can be drawn without loading old data
+    for index, _ in _rows(dataset_path):
+        total = index + 1
+    new_count = total - seen
+    replay_count = min(seen, int(new_count * replay_ratio))
+    replay = set(random.Random(seed).sample(range(seen), replay_count)) if replay_count else set()
+
+    # Second pass reads the selection and fingerprints exactly the rows counted,
+    # so rows appended while this runs are left for the next continuation
+    digest = hashlib.sha256()
+    for index, line in _rows(dataset_path):
+        if index >= total:
+            break
+        digest.update(line.rstrip(b"\r\n"))
+        digest.update(b"\n")
+        if index >= seen:
+            new_rows.append(json.loads(line))
+        elif index in replay:
+            replay_rows.append(json.loads(line))
+
+    return {
+        "dataset": {"rows": total, "sha256": digest.hexdigest()},
+        "new_rows": new_rows,
+        "replay_rows": replay_rows,
+    }
+
+
+def write_manifest(
+    output_dir: str,
+    dataset_path: str,
+    dataset: dict,
+    base_model: str,
+    version: str,
+    trained_rows: int,
+    parent_dir: Optional[str] = None,
+    parent: Optional[dict] = None,
+    replay_rows: int = 0,
+) -> dict:
+    """Write training_manifest.json, extending the parent's lineage if continuing
+
+    `dataset` is the fingerprint of the rows this run could see, taken when
+    the data was loaded rather than now, since rows may have been appended
+    during training.
+    """
+    manifest = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "base_model": base_model,
+        "version": version,
+        "dataset_path": os.path.abspath(dataset_path),
+        "dataset": dataset,
+        "trained_rows": trained_rows,
+        "replay_rows": replay_rows,
+        "mode": "continue" if parent else "full",
+        "parent": os.path.abspath(parent_dir) if parent_dir else None,
+        "lineage": [],
+    }
+
+    if parent:
+        manifest["lineage"] = parent.get("lineage", []) + [{
+            "adapter": manifest["parent"],
+            "created": parent["created"],
+            "version": parent["version"],
+            "mode": parent["mode"],
+            "dataset_rows": parent["dataset"]["rows"],
+        }]
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
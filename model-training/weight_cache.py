@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+HeySalad Base Model Weight Cache
+Converts a base model once into per-layer safetensors that later runs mmap and load lazily
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+import shutil
+import struct
+import resource
+import argparse
+from glob import glob
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import torch
+
+from preflight import PreflightError, read_safetensors_header
+
+CACHE_FORMAT = 1
+INDEX_FILENAME = "weight_cache.json"
+
+TORCH_DTYPES = {
+    "BOOL": torch.bool, "U8": torch.uint8, "I8": torch.int8,
+    "I16": torch.int16, "I32": torch.int32, "I64": torch.int64,
+    "F16": torch.float16, "BF16": torch.bfloat16, "F32": torch.float32, "F64": torch.float64,
+}
+
+DTYPE_NAMES = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+# Label of the bitsandbytes 8-bit cache (stored by transformers, not as per-layer files)
+INT8 = "int8"
+
+# Decoder blocks across common architectures: model.layers.N (Llama/Mistral), transformer.h.N (GPT-2) ...
+LAYER_PATTERN = re.compile(r"\.(?:layers|h|blocks)\.(\d+)\.")
+
+
+class WeightCacheError(Exception):
+    """Raised when a prepared weight cache is missing, stale or incomplete"""
+
+
+def dtype_name(dtype: Union[torch.dtype, str]) -> str:
+    return dtype if isinstance(dtype, str) else str(dtype).replace("torch.", "")
+
+
+def cache_path(cache_root: str, base_model: str, dtype: Union[torch.dtype, str]) -> str:
+    """Directory holding the prepared copy of one base model in one dtype"""
+    return os.path.join(cache_root, f"{base_model.strip('/').replace('/', '--')}-{dtype_name(dtype)}")
+
+
+def _group(name: str) -> str:
+    """File a tensor belongs to: one per decoder layer, plus one for everything else"""
+    match = LAYER_PATTERN.search(name)
+    return f"layer-{int(match.group(1)):04d}" if match else "base"
+
+
+def prepare_weight_cache(base_model: str, cache_dir: str, dtype: torch.dtype) -> dict:
+    """Load the base model once and write it back as per-layer safetensors in `dtype`
+
+    Tensors are stored already converted, so a cached load does no dtype
+    casts or key remapping. Tied weights are stored once and recorded in the
+    index. The cache directory is replaced atomically.
+    """
+    from transformers import AutoModelForCausalLM, GenerationConfig
+    from safetensors.torch import save_file
+
+    model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=dtype, low_cpu_mem_usage=True)
+
+    groups: Dict[str, Dict[str, torch.Tensor]] = OrderedDict()
+    seen: Dict[Tuple[int, tuple], str] = {}
+    tied: Dict[str, str] = {}
+    total_bytes = 0
+    for name, tensor in model.state_dict().items():
+        key = (tensor.data_ptr(), tuple(tensor.shape))
+        if tensor.numel() and key in seen:
+            tied[name] = seen[key]
+            continue
+        seen[key] = name
+        groups.setdefault(_group(name), {})[name] = tensor.contiguous()
+        total_bytes += tensor.numel() * tensor.element_size()
+
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        # "base" (embeddings, final norm, head) first, then layers in order
+        files = []
+        for group in sorted(groups, key=lambda g: (g != "base", g)):
+            filename = f"{group}.safetensors"
+            save_file(groups[group], os.path.join(tmp_dir, filename))
+            files.append(filename)
+
+        model.config.save_pretrained(tmp_dir)
+        try:
+            GenerationConfig.from_pretrained(base_model).save_pretrained(tmp_dir)
+        except (OSError, ValueError):
+            pass
+
+        index = {
+            "format": CACHE_FORMAT,
+            "base_model": base_model,
+            "dtype": dtype_name(dtype),
+            "files": files,
+            "tied": tied,
+            "bytes": total_bytes,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(tmp_dir, INDEX_FILENAME), "w") as f:
+            json.dump(index, f, indent=2)
+
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(cache_dir)), exist_ok=True)
+        os.replace(tmp_dir, cache_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return index
+
+
+def read_index(cache_dir: str, base_model: Optional[str] = None, dtype: Union[torch.dtype, str, None] = None) -> dict:
+    """Load and validate a cache index; raises WeightCacheError if it is unusable"""
+    path = os.path.join(cache_dir, INDEX_FILENAME)
+    if not os.path.exists(path):
+        raise WeightCacheError(f"No weight cache at {cache_dir}")
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except ValueError as e:
+        raise WeightCacheError(f"{cache_dir}: unreadable index ({e})")
+
+    if not isinstance(index, dict) or index.get("format") != CACHE_FORMAT:
+        raise WeightCacheError(f"{cache_dir}: cache format {index.get('format')} != {CACHE_FORMAT}")
+    if base_model and index["base_model"] != base_model:
+        raise WeightCacheError(f"{cache_dir}: prepared from {index['base_model']}, not {base_model}")
+    if dtype and index["dtype"] != dtype_name(dtype):
+        raise WeightCacheError(f"{cache_dir}: stored as {index['dtype']}, not {dtype_name(dtype)}")
+    for filename in index["files"]:
+        if not os.path.exists(os.path.join(cache_dir, filename)):
+            raise WeightCacheError(f"{cache_dir}: missing {filename}")
+    return index
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """Tensors of a safetensors file as zero-copy views of a private mmap
+
+    Nothing is read up front: pages are faulted in from the page cache the
+    first time a tensor is used, and the mapping is copy-on-write so in-place
+    updates never touch the file.
+    """
+    try:
+        header = read_safetensors_header(Path(path))
+    except PreflightError as e:
+        raise WeightCacheError(
+            f"{e}; rebuild with `python weight_cache.py --rebuild` or load with --no-weight-cache"
+        )
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (header_size,) = struct.unpack("<Q", mm[:8])
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = TORCH_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+        else:
+            # The tensor keeps the mmap alive for as long as it is referenced
+            tensors[name] = torch.frombuffer(mm, dtype=dtype, count=count, offset=data_start + start).view(info["shape"])
+    return tensors
+
+
+def _assign(model, name: str, tensor: torch.Tensor):
+    """Replace a meta parameter or buffer with a real tensor"""
+    module_name, _, leaf = name.rpartition(".")
+    module = model.get_submodule(module_name)
+    if leaf in module._parameters:
+        requires_grad = module._parameters[leaf].requires_grad
+        module._parameters[leaf] = torch.nn.Parameter(tensor, requires_grad=requires_grad)
+    else:
+        module._buffers[leaf] = tensor
+
+
+def load_from_weight_cache(cache_dir: str, device: str = "cpu") -> torch.nn.Module:
+    """Build the model on the meta device and fill it one layer file at a time
+
+    On CPU the weights stay mmap-backed, so load time is mostly the model
+    skeleton and RSS grows only as layers are first used. On GPU each layer
+    is copied over as it is read, keeping host memory to about one layer.
+    """
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM, GenerationConfig
+
+    index = read_index(cache_dir)
+    config = AutoConfig.from_pretrained(cache_dir)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=getattr(torch, index["dtype"]))
+
+    for filename in index["files"]:
+        for name, tensor in mmap_safetensors(os.path.join(cache_dir, filename)).items():
+            _assign(model, name, tensor if device == "cpu" else tensor.to(device))
+
+    for name, source in index["tied"].items():
+        module_name, _, leaf = name.rpartition(".")
+        model.get_submodule(module_name)._parameters[leaf] = model.get_parameter(source)
+    model.tie_weights()
+
+    missing = [name for name, param in model.named_parameters() if param.device.type == "meta"]
+    if missing:
+        raise WeightCacheError(f"{cache_dir}: no weights for {', '.join(missing[:5])}")
+
+    if device != "cpu":
+        # Non-persistent buffers (e.g. rotary frequencies) were built on CPU
+        model.to(device)
+    if os.path.exists(os.path.join(cache_dir, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(cache_dir)
+
+    return model
+
+
+def load_cached_model(
+    base_model: str,
+    dtype: torch.dtype,
+    cache_root: str,
+    device: str = "cpu",
+    rebuild: bool = False,
+) -> Tuple[torch.nn.Module, dict]:
+    """Load a base model through the weight cache, preparing it on first use
+
+    A missing, stale or corrupt cache (bad index, truncated layer file,
+    missing tensors) is rebuilt once from the base checkpoint. Returns the
+    model and load stats: whether the cache was hit, seconds spent
+    converting (first run only) and loading, and peak RSS after load.
+    """
+    cache_dir = cache_path(cache_root, base_model, dtype)
+    stats = {"weight_cache": "hit", "convert_s": 0.0}
+
+    reason = "rebuild requested" if rebuild else None
+    if reason is None:
+        start = time.perf_counter()
+        try:
+            read_index(cache_dir, base_model, dtype)
+            model = load_from_weight_cache(cache_dir, device)
+        except (WeightCacheError, OSError, ValueError) as e:
+            # Rebuild outside the handler so the traceback does not pin a half-loaded model
+            reason = str(e)
+
+    if reason is not None:
+        print(f"🧊 Preparing weight cache ({reason})...")
+        start = time.perf_counter()
+        index = prepare_weight_cache(base_model, cache_dir, dtype)
+        stats["weight_cache"] = "miss"
+        stats["convert_s"] = time.perf_counter() - start
+        print(f"   {len(index['files'])} files, {index['bytes'] / 1e9:.2f} GB in {stats['convert_s']:.1f}s: {cache_dir}")
+
+        start = time.perf_counter()
+        model = load_from_weight_cache(cache_dir, device)
+    stats["load_s"] = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    stats["peak_rss_gb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6
+    return model, stats
+
+
+def _save_quantized(model, base_model: str, cache_dir: str) -> dict:
+    """Write an already-quantized 8-bit model as a transformers checkpoint"""
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        # Small shards keep host memory bounded while reloading
+        model.save_pretrained(tmp_dir, max_shard_size="1GB", safe_serialization=True)
+        files = sorted(os.path.basename(path) for path in glob(os.path.join(tmp_dir, "*.safetensors")))
+        if not files:
+            # Older transformers / bitsandbytes only warn and skip 8-bit serialization
+            raise WeightCacheError("this transformers/bitsandbytes cannot serialize 8-bit weights "
+                                   "(needs transformers>=4.35 and bitsandbytes>=0.41.3)")
+
+        index = {
+            "format": CACHE_FORMAT,
+            "base_model": base_model,
+            "dtype": INT8,
+            "files": files,
+            "tied": {},
+            "bytes": sum(os.path.getsize(os.path.join(tmp_dir, f)) for f in files),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(tmp_dir, INDEX_FILENAME), "w") as f:
+            json.dump(index, f, indent=2)
+
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(cache_dir)), exist_ok=True)
+        os.replace(tmp_dir, cache_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return index
+
+
+def load_cached_8bit_model(base_model: str, cache_root: str, rebuild: bool = False) -> Tuple[torch.nn.Module, dict]:
+    """Load a bitsandbytes 8-bit base through a cache of the already-quantized weights
+
+    The first run quantizes from the fp16 checkpoint as usual and saves the
+    int8 weights and their scales; later runs read about half the bytes and
+    skip quantization. Int8 parameters have to be rebuilt by bitsandbytes on
+    the GPU, so this goes through from_pretrained (shard by shard, with
+    device_map="auto") rather than the mmap path.
+    """
+    from transformers import AutoModelForCausalLM
+
+    cache_dir = cache_path(cache_root, base_model, INT8)
+    stats = {"weight_cache": "hit", "convert_s": 0.0}
+
+    reason = "rebuild requested" if rebuild else None
+    if reason is None:
+        start = time.perf_counter()
+        try:
+            read_index(cache_dir, base_model, INT8)
+            model = AutoModelForCausalLM.from_pretrained(cache_dir, device_map="auto", torch_dtype=torch.float16)
+            stats["load_s"] = time.perf_counter() - start
+        except WeightCacheError as e:
+            reason = str(e)
+        except Exception as e:
+            # Truncated or corrupt shards surface as safetensors / OSError failures
+            reason = f"cached checkpoint failed to load: {e}"
+
+    if reason is not None:
+        print(f"🧊 Preparing 8-bit weight cache ({reason})...")
+        start = time.perf_counter()
+        model = AutoModelForCausalLM.from_pretrained(
+            base_model, load_in_8bit=True, device_map="auto", torch_dtype=torch.float16
+        )
+        stats["load_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            index = _save_quantized(model, base_model, cache_dir)
+            stats["weight_cache"] = "miss"
+            print(f"   {len(index['files'])} files, {index['bytes'] / 1e9:.2f} GB: {cache_dir}")
+        except WeightCacheError as save_error:
+            stats["weight_cache"] = "unsupported"
+            print(f"⚠️  Not caching 8-bit weights: {save_error}")
+        stats["convert_s"] = time.perf_counter() - start
+
+    stats["peak_rss_gb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6
+    return model, stats
+
+
+def _measure_load(base_model: str, dtype_key: str, cache_root: Optional[str]) -> dict:
+    """Load once in a fresh process and time the first forward (used by --benchmark)"""
+    from transformers import AutoModelForCausalLM
+
+    dtype = DTYPE_NAMES[dtype_key]
+    start = time.perf_counter()
+    if cache_root:
+        model, _ = load_cached_model(base_model, dtype, cache_root)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=dtype, low_cpu_mem_usage=True)
+    loaded = time.perf_counter()
+
+    with torch.inference_mode():
+        model(input_ids=torch.tensor([[1, 2, 3, 4]]))
+    first = time.perf_counter()
+
+    return {
+        "mode": "weight cache" if cache_root else "from_pretrained",
+        "load_s": loaded - start,
+        "first_forward_s": first - start,
+        "peak_rss_gb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6,
+    }
+
+
+def benchmark(base_model: str, dtype_key: str, cache_root: str) -> list:
+    """Compare from_pretrained with a warm weight cache, each in a fresh process"""
+    import multiprocessing
+
+    load_cached_model(base_model, DTYPE_NAMES[dtype_key], cache_root)
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for root in (None, cache_root):
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(_measure_load, (base_model, dtype_key, root)))
+
+    print("\n| Mode | Load (s) | Load + first forward (s) | Peak RSS (GB) |")
+    print("|------|----------|--------------------------|---------------|")
+    for result in results:
+        print(f"| {result['mode']} | {result['load_s']:.2f} | {result['first_forward_s']:.2f} | {result['peak_rss_gb']:.2f} |")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prepare (or benchmark) the per-layer mmap weight cache for a base model"
+    )
+    parser.add_argument("--base-model", type=str, default="meta-llama/Llama-2-7b-chat-hf", help="Base model")
+    parser.add_argument("--dtype", type=str, choices=sorted(DTYPE_NAMES) + [INT8], default="bf16",
+                        help="Stored dtype (int8: bitsandbytes 8-bit, needs a GPU)")
+    parser.add_argument("--cache-dir", type=str, default="./.weight_cache", help="Cache root")
+    parser.add_argument("--rebuild", action="store_true", help="Convert again even if a valid cache exists")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against from_pretrained in fresh processes")
+
+    args = parser.parse_args()
+
+    if args.dtype == INT8:
+        if args.benchmark:
+            parser.error("--benchmark compares CPU loads; use fp32, fp16 or bf16")
+        _, stats = load_cached_8bit_model(args.base_model, args.cache_dir, rebuild=args.rebuild)
+    elif args.benchmark:
+        benchmark(args.base_model, args.dtype, args.cache_dir)
+        return
+    else:
+        _, stats = load_cached_model(args.base_model, DTYPE_NAMES[args.dtype], args.cache_dir, rebuild=args.rebuild)
+    print(f"✅ Weight cache {stats['weight_cache']}: loaded in {stats['load_s']:.2f}s, "
+          f"peak RSS {stats['peak_rss_gb']:.2f} GB")
+
+if __name__ == "__main__":
+    main()